@@ -1,16 +1,26 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory
+from werkzeug.utils import secure_filename
 import os
 from PIL import Image
 
+from encoders import DEFAULT_PROFILE, available_profiles, encode, profile_extension
+from profiling import ProfileCollector
+from stats import RunStats
+from web_uploads import configure_uploads, keep_original
+
 app = Flask(__name__)
+# Uploads worden rechtstreeks uit de (in het geheugen gebufferde) requeststroom geconverteerd
+configure_uploads(app)
 
 # Map om geüploade bestanden op te slaan
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Profileren voor elke upload aanzetten met FOTOCONVERTER_PROFILING=1, of per upload via het formulier
+app.config['PROFILING'] = os.environ.get('FOTOCONVERTER_PROFILING') == '1'
 
 @app.route('/')
 def index():
-    return render_template('index.html')  # Render de index.html
+    return render_template('index.html', profiles=available_profiles())  # Render de index.html
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -20,17 +30,31 @@ def upload_file():
     if file.filename == '':
         return 'No selected file'
     
-    # Sla het bestand op
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(file_path)
+    profile = request.form.get('profile', DEFAULT_PROFILE)
+    if profile not in available_profiles():
+        return 'Unknown output profile'
+
+    # Converteer direct uit de uploadstroom; het origineel komt alleen op schijf als KEEP_ORIGINALS aan staat
+    filename = secure_filename(file.filename)
+    converted_filename = f'converted_{filename}{profile_extension(profile)}'
+    converted_file_path = os.path.join(UPLOAD_FOLDER, converted_filename)
+    if app.config['PROFILING'] or request.form.get('profiling'):
+        collector = ProfileCollector()
+        stats = RunStats(1)
+        collector.profile(filename, convert_upload, file.stream, converted_file_path, profile)
+        stats.record(filename)
+        paths = collector.write(stats.report_base(UPLOAD_FOLDER))
+        stats.write(UPLOAD_FOLDER, profile=paths, memory=collector.memory_summary())
+    else:
+        convert_upload(file.stream, converted_file_path, profile)
+    if app.config['KEEP_ORIGINALS']:
+        keep_original(file, app.config['ORIGINALS_FOLDER'], filename)
 
-    # Hier kun je de logica voor het converteren van de afbeelding toevoegen
-    # Voorbeeld: Converteer naar een andere indeling (bijv. PNG)
-    img = Image.open(file_path)
-    converted_file_path = os.path.join(UPLOAD_FOLDER, f'converted_{file.filename}.png')
-    img.save(converted_file_path, 'PNG')
+    return f'File uploaded and converted successfully! <a href="{url_for("uploaded_file", filename=converted_filename)}">Download here</a>'
 
-    return f'File uploaded and converted successfully! <a href="{url_for("uploaded_file", filename=f"converted_{file.filename}.png")}">Download here</a>'
+def convert_upload(source, converted_file_path, profile):
+    with Image.open(source) as img:
+        encode(img, converted_file_path, profile)
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
@@ -0,0 +1,203 @@
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PIL
+from PIL import Image
+
+from encoders import DEFAULT_PROFILE, available_profiles, encode
+from engine import RESIZE_QUALITIES, apply_jpeg_draft, crop_resize, parse_renditions, read_source
+from scanner import is_image_name
+
+try:
+    import resource
+except ImportError:
+    # Windows: geen getrusage, dan wordt het piekgeheugen niet gemeten
+    resource = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCHMARK_DIR, "uploads")
+SYNTHETIC_DIR = os.path.join(tempfile.gettempdir(), "fotoconverter-benchmark")
+STAGES = ("read", "decode", "resize", "encode", "write")
+
+
+def corpus_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if is_image_name(name))
+
+
+def synthetic_file(megapixels):
+    # Grote productfoto nagebootst: vloeiende verloop met ruis, als JPEG (3:2), eenmalig aangemaakt
+    os.makedirs(SYNTHETIC_DIR, exist_ok=True)
+    path = os.path.join(SYNTHETIC_DIR, f"synthetic-{megapixels}mp.jpg")
+    if os.path.exists(path):
+        return path
+
+    height = int(math.sqrt(megapixels * 1_000_000 * 2 / 3))
+    width = int(height * 3 / 2)
+    channels = [Image.effect_noise((width // 8, height // 8), 40 + 20 * i).resize((width, height), Image.BILINEAR)
+                for i in range(3)]
+    gradient = Image.linear_gradient("L").resize((width, height))
+    img = Image.merge("RGB", [Image.blend(channel, gradient, 0.5) for channel in channels])
+    img.save(path, "JPEG", quality=90)
+    return path
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux meldt kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(files, width, height, profile, resize_quality, output_directory):
+    stages = dict.fromkeys(STAGES, 0.0)
+    bytes_in = bytes_out = 0
+
+    for file in files:
+        started = time.perf_counter()
+        data = read_source(file)
+        stages["read"] += time.perf_counter() - started
+        bytes_in += len(data)
+
+        started = time.perf_counter()
+        img = Image.open(io.BytesIO(data))
+        apply_jpeg_draft(img, [(width, height)])
+        img.load()
+        stages["decode"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        img_resized = crop_resize(img, width, height, resize_quality)
+        stages["resize"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        encode(img_resized, buffer, profile)
+        stages["encode"] += time.perf_counter() - started
+        bytes_out += buffer.tell()
+
+        started = time.perf_counter()
+        with open(os.path.join(output_directory, "uitvoer"), "wb") as f:
+            f.write(buffer.getvalue())
+        stages["write"] += time.perf_counter() - started
+
+    total = sum(stages.values())
+    return {
+        "target": f"{width}x{height}",
+        "profile": profile,
+        "images": len(files),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "stages": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        "seconds": round(total, 4),
+        "images_per_second": round(len(files) / total, 2) if total else None,
+        "mb_per_second": round(bytes_in / (1024 * 1024) / total, 2) if total else None,
+    }
+
+
+def measure_case(files, width, height, profile, resize_quality, output_directory, repeats):
+    # Draait in een eigen, vers gestart proces: het piekgeheugen is dan dat van dit geval alleen.
+    # Eén opwarmronde (bestanden in de paginacache, Pillow-plugins geladen) telt niet mee; van de
+    # herhalingen telt de mediaan, zodat één uitschieter geen regressie of verbetering lijkt.
+    run_case(files, width, height, profile, resize_quality, output_directory)
+    runs = sorted((run_case(files, width, height, profile, resize_quality, output_directory) for _ in range(repeats)),
+                  key=lambda run: run["seconds"])
+    case = runs[len(runs) // 2]
+    rates = [run["images_per_second"] for run in runs if run["images_per_second"]]
+    case["repeats"] = repeats
+    case["images_per_second_range"] = [min(rates), max(rates)] if rates else None
+    case["peak_rss_mb"] = peak_rss_mb()
+    return case
+
+
+def compare(results, baseline, threshold):
+    # Regressie: een geval is meer dan threshold (fractie) langzamer dan in de baseline
+    baseline_cases = {(case["corpus"], case["target"], case["profile"]): case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        previous = baseline_cases.get((case["corpus"], case["target"], case["profile"]))
+        if not previous or not previous["images_per_second"] or not case["images_per_second"]:
+            continue
+        change = case["images_per_second"] / previous["images_per_second"] - 1
+        case["change"] = round(change, 4)
+        if change < -threshold:
+            regressions.append(f"{case['corpus']} {case['target']} {case['profile']}: "
+                               f"{previous['images_per_second']} -> {case['images_per_second']} beelden/s "
+                               f"({change:+.1%})")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Meet de bijsnijd/schaal/codeer-stappen op de voorbeeldfoto's.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="map met JPEG- en PNG-bestanden")
+    parser.add_argument("--sizes", default="1200x1200, 600x600, 150x150", help="doelformaten")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=available_profiles(), help="uitvoerprofiel")
+    parser.add_argument("--quality", default="balanced", choices=list(RESIZE_QUALITIES), help="schaalkwaliteit")
+    parser.add_argument("--synthetic", default="24,50,100",
+                        help="megapixels van synthetische foto's, kommagescheiden ('' om over te slaan)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="metingen per geval na één opwarmronde; de mediaan telt")
+    parser.add_argument("--output", default="benchmark.json", help="resultaten als JSON")
+    parser.add_argument("--baseline", help="eerder resultaat om mee te vergelijken")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="toegestane vertraging t.o.v. de baseline (0.10 = 10%%)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.repeats < 1:
+        build_parser().error("--repeats moet minstens 1 zijn")
+    sizes = [(width, height) for width, height, _ in parse_renditions(args.sizes)]
+
+    corpora = {"uploads": corpus_files(args.corpus)}
+    megapixels = [int(value) for value in args.synthetic.split(",") if value.strip()]
+    # In een apart proces aanmaken, zodat het genereren niet meetelt in het piekgeheugen
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        for value, path in zip(megapixels, pool.map(synthetic_file, megapixels)):
+            corpora[f"synthetic-{value}mp"] = [path]
+
+    results = {
+        "version": 2,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "machine": platform.machine(),
+        "cases": [],
+    }
+    # Elk geval in een nieuw (spawn, geen fork) proces, zodat het piekgeheugen niet van eerdere gevallen erft
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as output_directory:
+        for corpus, files in corpora.items():
+            for width, height in sizes:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    case = pool.submit(measure_case, files, width, height, args.profile, args.quality,
+                                       output_directory, args.repeats).result()
+                case["corpus"] = corpus
+                results["cases"].append(case)
+                low, high = case["images_per_second_range"] or (None, None)
+                print(f"{corpus:>18} {case['target']:>10}  {case['images_per_second']:>8} beelden/s "
+                      f"({low}-{high})  {case['mb_per_second']:>8} MB/s  {case['peak_rss_mb']} MB  " +
+                      "  ".join(f"{stage} {seconds:.3f}s" for stage, seconds in case["stages"].items()))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"Regressie: {regression}", file=sys.stderr)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
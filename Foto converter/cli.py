@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+
+from encoders import DEFAULT_PROFILE, available_profiles
+from engine import (OWN_OUTPUT_MODES, RESIZE_QUALITIES, ConversionEngine, ConversionSettings,
+                    parse_renditions)
+from scanner import iter_image_files
+from stats import ProgressThrottle
+from watcher import WatchDaemon
+
+# Zo vaak (in seconden) een voortgangsregel, los van het aantal bestanden
+PROGRESS_INTERVAL = 1.0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Foto's bijsnijden en schalen zoals de Foto Converter, zonder GUI. "
+                    "Schrijft per bestand een JSON-regel naar stdout.")
+    parser.add_argument("sources", nargs="+", help="bestanden of mappen (mappen worden recursief doorlopen)")
+    parser.add_argument("-o", "--output", required=True, help="doelmap")
+    parser.add_argument("--width", type=int, required=True, help="breedte")
+    parser.add_argument("--height", type=int, required=True, help="hoogte")
+    parser.add_argument("--sizes", default="", help="extra formaten, bijv. '1200x1200, 150x150:webp'")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=available_profiles(), help="uitvoerprofiel")
+    parser.add_argument("--quality", default="balanced", choices=list(RESIZE_QUALITIES), help="schaalkwaliteit")
+    parser.add_argument("--workers", type=int, default=None, help="aantal processen (standaard: alle kernen)")
+    parser.add_argument("--io-threads", type=int, default=None,
+                        help="threads voor lezen en schrijven, handig op netwerkschijven")
+    parser.add_argument("--own-outputs", default="skip", choices=OWN_OUTPUT_MODES,
+                        help="wat te doen met bestanden die al door ons geconverteerd zijn")
+    parser.add_argument("--no-incremental", action="store_true", help="alles opnieuw converteren")
+    parser.add_argument("--sniff", action="store_true",
+                        help="foto's herkennen aan de inhoud in plaats van aan de extensie")
+    parser.add_argument("--profiling", action="store_true",
+                        help="cProfile en geheugenpieken meten; schrijft .pstats/.folded naast het rapport")
+    parser.add_argument("--watch", action="store_true",
+                        help="blijven draaien en nieuwe bestanden in de bronmappen meteen converteren")
+    parser.add_argument("--poll", action="store_true", help="bij --watch: mappen periodiek scannen in plaats van inotify")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="bij --watch: seconden dat een bestand onveranderd moet zijn voor het geconverteerd wordt")
+    return parser
+
+
+def emit(record):
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        renditions = [(args.width, args.height, args.profile)]
+        renditions += parse_renditions(args.sizes, args.profile)
+        settings = ConversionSettings(args.output, args.width, args.height, resize_quality=args.quality,
+                                      profile=args.profile, renditions=renditions,
+                                      incremental=not args.no_incremental, own_outputs=args.own_outputs)
+    except ValueError as e:
+        print(f"Ongeldige instellingen: {e}", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.watch:
+        return watch(args, settings)
+
+    # Een iterator in plaats van een lijst: de engine verwerkt de mapwandeling lazy
+    source_files = iter_image_files(args.sources, exclude=args.output, sniff=args.sniff)
+    engine = ConversionEngine(settings, workers=args.workers, io_threads=args.io_threads, profiling=args.profiling)
+    # Netjes stoppen: lopende foto's afmaken en het manifest bewaren, zodat een volgende run verdergaat
+    signal.signal(signal.SIGTERM, lambda *_: engine.cancel())
+
+    started = time.perf_counter()
+    throttle = ProgressThrottle(rate=1 / PROGRESS_INTERVAL)
+    done = 0
+    for file, output_files, error in engine.stream(source_files):
+        done += 1
+        emit({"event": "result", "file": file, "outputs": output_files, "error": error})
+
+        if throttle.update(done, error=error):
+            # Tempo en ETA uit RunStats: bestanden die via het manifest zijn overgeslagen tellen daar niet mee
+            progress = {"event": "progress", "done": done, "errors": throttle.errors,
+                        "images_per_second": round(engine.stats.images_per_second(), 2)}
+            eta = engine.stats.eta()
+            if eta is not None:
+                progress["eta_seconds"] = round(eta, 1)
+            emit(progress)
+
+    elapsed = time.perf_counter() - started
+    errors = throttle.errors
+    emit({"event": "summary", "done": done, "errors": errors, "seconds": round(elapsed, 3),
+          "stage_seconds": engine.stats.report()["stage_seconds"], "report": engine.report_path, "profile": engine.profile_paths or None, **engine.summary()})
+    return 1 if errors else 0
+
+
+def watch(args, settings):
+    if args.no_incremental:
+        # Zonder manifest zou elke herstart alles opnieuw converteren
+        print("--watch werkt altijd incrementeel; --no-incremental wordt genegeerd", file=sys.stderr)
+        settings.incremental = True
+
+    daemon = WatchDaemon(args.sources, settings, workers=args.workers, settle_seconds=args.settle,
+                         polling=args.poll)
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+
+    def on_result(done, total_files, file, output_files, error):
+        emit({"event": "result", "file": file, "outputs": output_files, "error": error})
+
+    try:
+        daemon.run(on_result=on_result)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
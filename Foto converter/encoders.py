@@ -0,0 +1,126 @@
+import html
+import json
+import re
+from xml.sax.saxutils import escape
+
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+try:
+    # Oudere Pillow-versies kunnen alleen AVIF schrijven met deze plugin
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+
+DEFAULT_PROFILE = "png"
+
+# Sleutel van het tEXt-chunk (PNG) of commentaar (JPEG) waarmee we onze eigen uitvoer herkennen
+PROVENANCE_KEY = "fotoconverter"
+# WebP en AVIF hebben geen tekstveld; daar komt dezelfde JSON als attribuut in een XMP-pakket
+XMP_NAMESPACE = "https://fotoconverter.local/ns/1.0/"
+XMP_PACKET = ('<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>'
+              '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+              '<rdf:Description rdf:about="" xmlns:{key}="{namespace}" {key}:provenance="{text}"/>'
+              '</rdf:RDF></x:xmpmeta><?xpacket end="w"?>')
+XMP_PATTERN = re.compile(rf'{PROVENANCE_KEY}:provenance="([^"]*)"')
+
+# Naam -> (Pillow-formaat, extensie, opslagopties, label)
+ENCODER_PROFILES = {
+    "png": ("PNG", ".png", {}, "PNG"),
+    "png-fast": ("PNG", ".png", {"compress_level": 1}, "PNG (snel)"),
+    "png-small": ("PNG", ".png", {"optimize": True}, "PNG (klein)"),
+    "webp": ("WEBP", ".webp", {"quality": 85, "method": 4}, "WebP (kwaliteit 85)"),
+    "webp-fast": ("WEBP", ".webp", {"quality": 80, "method": 0}, "WebP (snel)"),
+    "jpeg": ("JPEG", ".jpg", {"quality": 88, "optimize": True, "progressive": True}, "JPEG (kwaliteit 88)"),
+    "avif": ("AVIF", ".avif", {"quality": 70}, "AVIF (kwaliteit 70)"),
+}
+
+
+def available_profiles():
+    # Alleen profielen waarvoor deze Pillow-installatie een encoder heeft
+    Image.init()
+    return [name for name, (image_format, _, _, _) in ENCODER_PROFILES.items() if image_format in Image.SAVE]
+
+
+def profile_label(profile):
+    return ENCODER_PROFILES[profile][3]
+
+
+def profile_extension(profile):
+    return ENCODER_PROFILES[profile][1]
+
+
+def profile_mimetype(profile):
+    Image.init()
+    return Image.MIME.get(ENCODER_PROFILES[profile][0], "application/octet-stream")
+
+
+def check_profile(profile):
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"Onbekend uitvoerprofiel: {profile}")
+    if profile not in available_profiles():
+        raise ValueError(f"Uitvoerprofiel {profile} is niet beschikbaar in deze installatie")
+
+
+def prepare_mode(img, image_format):
+    if image_format == "JPEG":
+        # JPEG kent geen transparantie: leg de foto op een witte achtergrond
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            return background
+        if img.mode != "RGB":
+            return img.convert("RGB")
+    elif image_format in ("WEBP", "AVIF") and img.mode not in ("RGB", "RGBA"):
+        return img.convert("RGBA" if "A" in img.mode or img.mode == "P" else "RGB")
+    return img
+
+
+def provenance_options(image_format, provenance):
+    text = json.dumps(provenance, sort_keys=True)
+    if image_format == "PNG":
+        pnginfo = PngInfo()
+        pnginfo.add_text(PROVENANCE_KEY, text)
+        return {"pnginfo": pnginfo}
+    if image_format == "JPEG":
+        return {"comment": f"{PROVENANCE_KEY}:{text}"}
+    if image_format in ("WEBP", "AVIF"):
+        xmp = XMP_PACKET.format(key=PROVENANCE_KEY, namespace=XMP_NAMESPACE, text=escape(text, {'"': "&quot;"}))
+        return {"xmp": xmp.encode("utf-8")}
+    return {}
+
+
+def xmp_provenance(xmp):
+    if isinstance(xmp, bytes):
+        xmp = xmp.decode("utf-8", "replace")
+    match = XMP_PATTERN.search(xmp)
+    return html.unescape(match.group(1)) if match else None
+
+
+def read_provenance(img):
+    # Werkt op een net geopende afbeelding: tEXt-chunks, JPEG-commentaar en XMP staan in de header
+    text = img.info.get(PROVENANCE_KEY)
+    if text is None and img.info.get("xmp"):
+        text = xmp_provenance(img.info["xmp"])
+    if text is None:
+        comment = img.info.get("comment", b"")
+        if isinstance(comment, bytes):
+            comment = comment.decode("utf-8", "replace")
+        if not comment.startswith(f"{PROVENANCE_KEY}:"):
+            return None
+        text = comment[len(PROVENANCE_KEY) + 1:]
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def encode(img, output_file, profile=DEFAULT_PROFILE, provenance=None):
+    # output_file mag een bestand of een open binair bestandsobject zijn
+    image_format, _, options, _ = ENCODER_PROFILES[profile]
+    if provenance:
+        options = dict(options, **provenance_options(image_format, provenance))
+    prepare_mode(img, image_format).save(output_file, image_format, **options)
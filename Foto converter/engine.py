@@ -0,0 +1,579 @@
+import io
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from PIL import Image
+
+from encoders import DEFAULT_PROFILE, check_profile, encode, profile_extension, read_provenance
+from manifest import Manifest, content_hash_data, fast_hash_data, settings_key
+from profiling import ProfileCollector, profiled
+from stats import RunStats
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+# Threads voor lezen en schrijven; die wachten vooral op schijf of netwerk (NFS), niet op de CPU
+DEFAULT_IO_THREADS = 4
+
+
+# Snelheid tegenover kwaliteit: (filter, reducing_gap). Met een reducing_gap wordt eerst
+# met een goedkope integer-reductie verkleind en daarna pas met het filter geschaald.
+RESIZE_QUALITIES = {
+    "fast": (Image.BILINEAR, 2.0),
+    "balanced": (Image.LANCZOS, 3.0),
+    "best": (Image.LANCZOS, None),
+}
+
+# Een kleinere uitvoer wordt alleen van de vorige (grotere) uitvoer afgeleid als die
+# minstens zoveel keer groter is; anders wordt vanuit de bron geschaald.
+CHAIN_FACTOR = 2
+
+# Wat te doen met bestanden die zelf al door ons geconverteerd zijn
+OWN_OUTPUT_MODES = ("skip", "passthrough", "convert")
+
+
+class ConversionSettings:
+    def __init__(self, target_directory, target_width, target_height, jpeg_draft=True,
+                 resize_quality="balanced", profile=DEFAULT_PROFILE, renditions=None, incremental=True,
+                 own_outputs="skip", deduplicate=True):
+        if resize_quality not in RESIZE_QUALITIES:
+            raise ValueError(f"Onbekende kwaliteit: {resize_quality}")
+        if own_outputs not in OWN_OUTPUT_MODES:
+            raise ValueError(f"Onbekende modus voor eigen uitvoer: {own_outputs}")
+
+        # Elke uitvoer is (breedte, hoogte, profiel); standaard alleen het doelformaat.
+        # Precies dezelfde uitvoer twee keer opgegeven (bijv. het doelformaat ook in de extra formaten) telt één keer.
+        renditions = list(dict.fromkeys(tuple(rendition) for rendition in renditions or
+                                        [(target_width, target_height, profile)]))
+        for _, _, rendition_profile in renditions:
+            check_profile(rendition_profile)
+
+        self.target_directory = target_directory
+        self.target_width = target_width
+        self.target_height = target_height
+        self.jpeg_draft = jpeg_draft
+        self.resize_quality = resize_quality
+        self.profile = profile
+        self.renditions = renditions
+        self.incremental = incremental
+        self.own_outputs = own_outputs
+        self.deduplicate = deduplicate
+
+
+def parse_renditions(text, default_profile=DEFAULT_PROFILE):
+    # "1200x1200, 600x600:webp, 150x150" -> [(1200, 1200, "png"), (600, 600, "webp"), ...]
+    renditions = []
+    for part in text.replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        size, _, profile = part.partition(":")
+        width, _, height = size.lower().partition("x")
+        width, height = int(width), int(height)
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Ongeldig formaat: {part}")
+        profile = profile.strip() or default_profile
+        check_profile(profile)
+        renditions.append((width, height, profile))
+    return renditions
+
+
+def center_crop_box(img_width, img_height, target_width, target_height):
+    # Bereken het grootste middenstuk met dezelfde verhouding als het doel
+    aspect_ratio = img_width / img_height
+    target_ratio = target_width / target_height
+
+    if aspect_ratio > target_ratio:
+        new_width = int(img_height * target_ratio)
+        offset = (img_width - new_width) // 2
+        return (offset, 0, offset + new_width, img_height)
+
+    new_height = int(img_width / target_ratio)
+    offset = (img_height - new_height) // 2
+    return (0, offset, img_width, offset + new_height)
+
+
+def apply_jpeg_draft(img, sizes):
+    # JPEG's kunnen direct op 1/2, 1/4 of 1/8 van de grootte gedecodeerd worden.
+    # Vraag de kleinste schaal waarbij elk bijgesneden deel nog minstens doelformaat heeft.
+    if img.format != "JPEG":
+        return
+
+    requested_width = requested_height = 0
+    for target_width, target_height in sizes:
+        left, top, right, bottom = center_crop_box(img.width, img.height, target_width, target_height)
+        crop_width, crop_height = right - left, bottom - top
+        if crop_width <= target_width or crop_height <= target_height:
+            return
+
+        requested_width = max(requested_width, math.ceil(img.width * target_width / crop_width))
+        requested_height = max(requested_height, math.ceil(img.height * target_height / crop_height))
+
+    if requested_width and requested_height:
+        img.draft(img.mode, (requested_width, requested_height))
+
+
+def crop_resize(img, target_width, target_height, resize_quality="balanced"):
+    # Schaal direct vanuit het middenstuk van de bron, zonder tussentijdse crop-kopie
+    resample, reducing_gap = RESIZE_QUALITIES[resize_quality]
+    crop_box = center_crop_box(img.width, img.height, target_width, target_height)
+    return img.resize((target_width, target_height), resample, box=crop_box, reducing_gap=reducing_gap)
+
+
+def can_chain(previous, target_width, target_height, resize_quality):
+    # Alleen afleiden bij dezelfde verhouding en genoeg resolutie in de vorige uitvoer
+    if resize_quality == "best":
+        return False
+    same_ratio = previous.width * target_height == previous.height * target_width
+    return (same_ratio and previous.width >= CHAIN_FACTOR * target_width
+            and previous.height >= CHAIN_FACTOR * target_height)
+
+
+def unlink_existing(output_file):
+    # Nooit over een bestaand bestand heen schrijven: het kan een hardlink van een duplicaat zijn
+    try:
+        os.remove(output_file)
+    except FileNotFoundError:
+        pass
+
+
+def output_path(file, settings, rendition):
+    width, height, profile = rendition
+    base_name = os.path.splitext(os.path.basename(file))[0]
+    if len(settings.renditions) > 1:
+        base_name = f"{base_name}_{width}x{height}"
+    extension = profile_extension(profile)
+    if sum(1 for other_width, other_height, other_profile in settings.renditions
+           if (other_width, other_height) == (width, height) and profile_extension(other_profile) == extension) > 1:
+        # Zelfde formaat en extensie in twee profielen (bijv. png en png-small): anders overschrijft de een de ander
+        base_name = f"{base_name}_{profile}"
+    return os.path.join(settings.target_directory, f"{base_name}_converted{extension}")
+
+
+def render(img, file, settings, provenance=None, timings=None):
+    # Alle uitvoerformaten uit één gedecodeerde bron, van groot naar klein; geeft (pad, bytes) terug
+    timings = timings if timings is not None else {}
+    encoded = []
+    rendered = []
+    for rendition in sorted(settings.renditions, key=lambda r: r[0] * r[1], reverse=True):
+        width, height, profile = rendition
+        # De kleinste eerdere uitvoer die nog voldoet, anders de bron zelf
+        source = next((previous for previous in reversed(rendered)
+                       if can_chain(previous, width, height, settings.resize_quality)), img)
+        started = time.perf_counter()
+        img_resized = crop_resize(source, width, height, settings.resize_quality)
+        timings["resize"] = timings.get("resize", 0.0) + time.perf_counter() - started
+
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        encode(img_resized, buffer, profile, dict(provenance or {}, rendition=list(rendition)))
+        timings["encode"] = timings.get("encode", 0.0) + time.perf_counter() - started
+        timings["bytes_out"] = timings.get("bytes_out", 0) + buffer.tell()
+
+        encoded.append((output_path(file, settings, rendition), buffer.getvalue()))
+        rendered.append(img_resized)
+    return encoded
+
+
+def read_source(file):
+    with open(file, "rb") as f:
+        return f.read()
+
+
+def read_signed(file, content=False):
+    # Inhoud plus grootte, mtime en snelle hash van precies deze bytes, voor het manifest.
+    # De stat komt van de open handle: wordt de bron daarna verplaatst, dan klopt de vermelding nog.
+    # Met content ook de volledige hash, voor het ontdubbelen.
+    with open(file, "rb") as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    signature = {"size": len(data), "mtime_ns": stat.st_mtime_ns, "hash": fast_hash_data(data)}
+    if content:
+        signature["content"] = content_hash_data(data)
+    return data, signature
+
+
+def convert_data(file, data, settings):
+    # Draait in een werkproces: decoderen, bijsnijden, schalen en coderen, zonder zelf te lezen of schrijven.
+    # Geeft (uitvoer, tijden per stap) terug; tijden is None als er niets geconverteerd is.
+    started = time.perf_counter()
+    with Image.open(io.BytesIO(data)) as img:
+        # Image.open leest alleen de header; eigen uitvoer herkennen we zonder te decoderen
+        if settings.own_outputs != "convert" and read_provenance(img):
+            if settings.own_outputs == "skip":
+                return [], None
+            output_file = os.path.join(settings.target_directory, os.path.basename(file))
+            if os.path.abspath(output_file) == os.path.abspath(file):
+                return [(output_file, None)], None
+            return [(output_file, data)], None
+
+        if settings.jpeg_draft:
+            apply_jpeg_draft(img, [(width, height) for width, height, _ in settings.renditions])
+        img.load()
+        timings = {"decode": time.perf_counter() - started, "bytes_in": len(data)}
+
+        provenance = {
+            "source": os.path.basename(file),
+            "source_hash": fast_hash_data(data),
+            "params": settings_key(settings),
+        }
+        return render(img, file, settings, provenance, timings), timings
+
+
+def write_outputs(encoded):
+    # None betekent: het bestand staat er al (eigen uitvoer die op zijn plek blijft)
+    for output_file, data in encoded:
+        if data is None:
+            continue
+        unlink_existing(output_file)
+        with open(output_file, "wb") as f:
+            f.write(data)
+    return [output_file for output_file, _ in encoded]
+
+
+def convert_file(file, settings):
+    # Lezen, converteren en schrijven in één keer; de engine doet dit als pijplijn
+    encoded, _ = convert_data(file, read_source(file), settings)
+    return write_outputs(encoded)
+
+
+def timed(function, *args):
+    # Voor de lees- en schrijfthreads: resultaat plus de duur van de aanroep
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def link_or_copy(source, destination):
+    # Hardlink, anders een reflink (copy-on-write) en als laatste redmiddel een gewone kopie
+    if os.path.abspath(source) == os.path.abspath(destination):
+        return
+    unlink_existing(destination)
+    try:
+        os.link(source, destination)
+        return
+    except OSError:
+        pass
+
+    if sys.platform.startswith("linux"):
+        import fcntl
+        FICLONE = 0x40049409
+        try:
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            os.remove(destination)
+    shutil.copyfile(source, destination)
+
+
+# Tussentijds het journaal van het manifest naar schijf, zodat een afgebroken batch niet alles kwijt is
+MANIFEST_FLUSH_SECONDS = 5.0
+
+# Einde van de invoer, te onderscheiden van None (overgeslagen bestand)
+STOP = object()
+
+
+class ConversionEngine:
+    def __init__(self, settings, workers=None, max_pending=None, pool=None, io_threads=None, report=True,
+                 profiling=False):
+        self.settings = settings
+        self.workers = workers or default_workers()
+        # Een langlopende aanroeper (zoals de map-bewaker) kan zijn eigen pool hergebruiken
+        self.pool = pool
+        # Hooguit zoveel bestanden tegelijk in de rekenstap, zodat het geheugen vlak blijft
+        self.max_pending = max_pending or self.workers * 4
+        self.io_threads = io_threads or DEFAULT_IO_THREADS
+        # Na elke run een JSON-rapport in de doelmap (uit voor de map-bewaker, die vele kleine batches draait)
+        self.report = report
+        self.report_path = None
+        self.stats = RunStats()
+        # Opt-in: cProfile en tracemalloc rond elke conversie, opgeteld over alle werkprocessen
+        self.profiling = profiling
+        self.profile_collector = None
+        self.profile_paths = {}
+        self.manifest = None
+        self.skipped = 0
+        self.dedup_stats = {}
+        self.converted = 0
+        # Bediening vanuit een andere thread: pauzeren laat lopende conversies afmaken en start niets nieuws,
+        # annuleren haalt wachtend werk ook uit de procespool. Wat klaar is staat in het manifest (het checkpoint),
+        # zodat een nieuwe run met dezelfde bestanden verdergaat waar deze stopte.
+        self.running = threading.Event()
+        self.running.set()
+        self.cancelled = threading.Event()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.running.set()
+
+    def is_paused(self):
+        return not self.running.is_set()
+
+    def run(self, source_files, on_result=None):
+        # on_result(done, total, file, output_files, error) wordt per bestand aangeroepen
+        source_files = list(source_files)
+        return list(self.stream(source_files, on_result, len(source_files)))
+
+    def stream(self, source_files, on_result=None, total_files=None):
+        # Levert (file, output_files, error) per bestand zodra het klaar is. Bij een lijst worden identieke
+        # bronnen tijdens het lezen herkend en gelinkt; een iterator (bijv. een mapwandeling) wordt zonder
+        # ontdubbeling verwerkt, want de tabel met hashes zou met de hele boom meegroeien.
+        self.skipped = 0
+        self.dedup_stats = {"duplicates": 0, "bytes_saved": 0, "seconds_saved": 0.0}
+        self.converted = 0
+        self.stats = RunStats(total_files)
+        self.profile_collector = ProfileCollector() if self.profiling else None
+        self.profile_paths = {}
+
+        manifest = None
+        params = settings_key(self.settings)
+        if self.settings.incremental:
+            # Eén keer laden; bij herhaalde runs (map-bewaker) blijft het in het geheugen
+            if self.manifest is None:
+                self.manifest = Manifest(self.settings.target_directory)
+            manifest = self.manifest
+
+        ready = deque()
+        done = 0
+        flushed = time.monotonic()
+
+        def finish(file, output_files, error, up_to_date=False, timings=None, signature=None):
+            nonlocal done, flushed
+            done += 1
+            if manifest and not error and not up_to_date:
+                try:
+                    manifest.record(file, params, output_files, signature)
+                except OSError as e:
+                    # Bron of uitvoer intussen weg: een fout voor dit bestand, niet voor de hele batch
+                    error = str(e)
+                else:
+                    if time.monotonic() - flushed >= MANIFEST_FLUSH_SECONDS:
+                        manifest.flush()
+                        flushed = time.monotonic()
+            # Al up-to-date, of eigen uitvoer die niet opnieuw geconverteerd hoeft te worden
+            skipped = up_to_date or (not error and not output_files)
+            self.stats.record(file, timings, error, skipped)
+            self.skipped += skipped
+            if on_result:
+                on_result(done, total_files, file, output_files, error)
+            ready.append((file, output_files, error))
+
+        def checkpoint():
+            if manifest:
+                manifest.save()
+
+        def pending_files():
+            # None na elk overgeslagen bestand, zodat de aanroeper tussendoor resultaten kan doorgeven
+            for file in source_files:
+                output_files = self.lookup(manifest, file, params)
+                if output_files is None:
+                    yield file
+                else:
+                    finish(file, output_files, None, up_to_date=True)
+                    yield None
+
+        try:
+            with nullcontext(self.pool) if self.pool else ProcessPoolExecutor(max_workers=self.workers) as pool, \
+                    ThreadPoolExecutor(max_workers=self.io_threads) as io_pool:
+                deduplicate = self.settings.deduplicate and isinstance(source_files, list)
+                started = time.perf_counter()
+                for _ in self.pipeline(pool, io_pool, pending_files(), finish, checkpoint, deduplicate):
+                    while ready:
+                        yield ready.popleft()
+                # Wat na de laatste yield nog klaarkwam (bijv. up-to-date bestanden aan het eind van de invoer)
+                while ready:
+                    yield ready.popleft()
+
+                if self.converted:
+                    # Geschatte rekentijd per geconverteerd bestand, maal het aantal overgeslagen duplicaten
+                    elapsed = time.perf_counter() - started
+                    per_file = elapsed * min(self.workers, self.converted) / self.converted
+                    self.dedup_stats["seconds_saved"] = per_file * self.dedup_stats["duplicates"]
+
+            extra = {}
+            if self.profile_collector:
+                self.profile_paths = self.profile_collector.write(self.stats.report_base(self.settings.target_directory))
+                extra = {"profile": self.profile_paths, "memory": self.profile_collector.memory_summary()}
+            if self.report:
+                self.report_path = self.stats.write(self.settings.target_directory, workers=self.workers,
+                                                    renditions=self.settings.renditions, **extra, **self.summary())
+        finally:
+            if manifest:
+                manifest.save()
+
+    def pipeline(self, pool, io_pool, pending, finish, checkpoint=None, deduplicate=False):
+        # Drie stappen met begrensde wachtrijen: lezen (threads) -> rekenen (processen) -> schrijven (threads).
+        # Lezen en schrijven overlappen zo met decoderen en schalen; de grenzen houden het geheugen vlak.
+        io_limit = self.io_threads * 2
+        # Future -> bestand onderweg: {"file", "timings", "signature" (voor het manifest), "digest",
+        # "duplicates" (die op zijn uitvoer wachten)}. Per future en niet per pad, want hetzelfde pad
+        # kan twee keer in de invoer staan (bijv. overlappende bronmappen).
+        reads, computes, writes = {}, {}, {}
+        # Ontdubbelen: inhoudshash -> [origineel, (uitvoer, fout) zodra het klaar is]
+        originals = {}
+        read_ready, write_ready = deque(), deque()
+        pending = iter(pending)
+        exhausted = False
+        checkpointed = False
+
+        while True:
+            if self.cancelled.is_set():
+                # Nog niet gestart werk vervalt; wat al in een werkproces draait wordt netjes afgemaakt
+                exhausted = True
+                read_ready.clear()
+                for stage in (reads, computes):
+                    for future in [future for future in stage if future.cancel()]:
+                        del stage[future]
+
+            while write_ready and len(writes) < io_limit:
+                item, encoded = write_ready.popleft()
+                writes[io_pool.submit(timed, write_outputs, encoded)] = item
+            # Gepauzeerd: al gelezen bestanden blijven wachten, er start niets nieuws in de procespool
+            while (read_ready and self.running.is_set() and len(computes) < self.max_pending
+                   and len(write_ready) < io_limit):
+                item, data = read_ready.popleft()
+                if self.profile_collector:
+                    computes[pool.submit(profiled, convert_data, item["file"], data, self.settings)] = item
+                else:
+                    computes[pool.submit(convert_data, item["file"], data, self.settings)] = item
+
+            skipped = 0
+            while not exhausted and self.running.is_set() and len(reads) + len(read_ready) < io_limit and skipped < self.max_pending:
+                file = next(pending, STOP)
+                if file is STOP:
+                    exhausted = True
+                elif file is None:
+                    skipped += 1
+                else:
+                    reads[io_pool.submit(timed, read_signed, file, deduplicate)] = {"file": file}
+
+            if not (reads or computes or writes):
+                if exhausted and not read_ready:
+                    return
+                if not self.running.is_set():
+                    # Gepauzeerd en alles afgerond: eenmaal het checkpoint bewaren en wachten op hervatten
+                    if checkpoint and not checkpointed:
+                        checkpoint()
+                        checkpointed = True
+                    self.running.wait(0.2)
+                else:
+                    checkpointed = False
+                yield
+                continue
+
+            completed, _ = wait([*reads, *computes, *writes], return_when=FIRST_COMPLETED)
+            for future in completed:
+                stage = reads if future in reads else computes if future in computes else writes
+                item = stage.pop(future)
+                file = item["file"]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    item.pop("timings", None)
+                    self.complete(item, [], str(e), finish, originals)
+                    continue
+
+                if stage is reads:
+                    (data, signature), seconds = result
+                    digest = signature.pop("content", None)
+                    if digest is not None:
+                        original = originals.get(digest)
+                        if original:
+                            # Zelfde inhoud als een eerder gelezen bestand: niet converteren, maar de uitvoer linken
+                            if original[1] is None:
+                                original[0]["duplicates"].append((file, signature))
+                            else:
+                                self.finish_duplicate(original[0]["file"], file, *original[1], finish, signature)
+                            continue
+                        originals[digest] = [item, None]
+                        item.update(digest=digest, duplicates=[])
+                    item.update(signature=signature, timings={"read": seconds})
+                    read_ready.append((item, data))
+                elif stage is computes:
+                    if self.profile_collector:
+                        result, profile_stats, peak = result
+                        self.profile_collector.add(profile_stats, file, peak)
+                    encoded, compute_timings = result
+                    if compute_timings:
+                        self.converted += 1
+                        item["timings"].update(compute_timings)
+                    else:
+                        # Eigen uitvoer, niet geconverteerd
+                        del item["timings"]
+                    write_ready.append((item, encoded))
+                else:
+                    output_files, seconds = result
+                    if "timings" in item:
+                        item["timings"]["write"] = seconds
+                    self.complete(item, output_files, None, finish, originals)
+            yield
+
+    def complete(self, item, output_files, error, finish, originals):
+        file = item["file"]
+        finish(file, output_files, error, timings=item.get("timings"), signature=item.get("signature"))
+        if "digest" in item:
+            # Duplicaten die pas later gelezen worden, linken direct naar deze uitvoer
+            originals[item["digest"]][1] = (output_files, error)
+        for duplicate, signature in item.get("duplicates", []):
+            self.finish_duplicate(file, duplicate, output_files, error, finish, signature)
+
+    def finish_duplicate(self, original, duplicate, output_files, error, finish, signature=None):
+        if error:
+            finish(duplicate, [], error)
+            return
+        try:
+            finish(duplicate, self.link_outputs(original, duplicate, output_files), None, signature=signature)
+        except OSError as e:
+            finish(duplicate, [], str(e))
+
+    def lookup(self, manifest, file, params):
+        if manifest is None:
+            return None
+        try:
+            return manifest.lookup(file, params)
+        except OSError:
+            # Bron onleesbaar: laat de conversie de fout melden
+            return None
+
+    def link_outputs(self, original, duplicate, output_files):
+        # Uitvoernamen beginnen met de basisnaam van de bron; vervang die door die van het duplicaat
+        original_base = os.path.splitext(os.path.basename(original))[0]
+        duplicate_base = os.path.splitext(os.path.basename(duplicate))[0]
+        linked_files = []
+        for output_file in output_files:
+            output_name = os.path.basename(output_file)
+            linked_name = duplicate_base + output_name[len(original_base):]
+            if output_name == os.path.basename(original):
+                # Doorgegeven eigen uitvoer houdt de volledige naam, inclusief extensie
+                linked_name = os.path.basename(duplicate)
+
+            linked_file = os.path.join(os.path.dirname(output_file), linked_name)
+            link_or_copy(output_file, linked_file)
+            linked_files.append(linked_file)
+            self.dedup_stats["bytes_saved"] += os.path.getsize(output_file)
+
+        self.dedup_stats["duplicates"] += 1
+        return linked_files
+
+    def summary(self):
+        return {
+            "skipped": self.skipped,
+            "cancelled": self.cancelled.is_set(),
+            **self.dedup_stats,
+        }
@@ -0,0 +1,65 @@
+class FileQueue:
+    # Geordende wachtrij met een index pad -> rij: toevoegen en 'staat het er al in' zijn O(1),
+    # ook bij tienduizenden bestanden. Na verwijderen worden de rijnummers erachter lui bijgewerkt.
+    def __init__(self):
+        self.items = []
+        self.index = {}
+        # Rijnummers vanaf deze positie zijn verouderd
+        self.stale_from = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __contains__(self, file):
+        return file in self.index
+
+    def __getitem__(self, row):
+        return self.items[row]
+
+    def add(self, files):
+        # Geeft de echt nieuwe bestanden terug, in volgorde en zonder dubbelen
+        added = []
+        for file in files:
+            if file not in self.index:
+                self.index[file] = len(self.items)
+                self.items.append(file)
+                added.append(file)
+        return added
+
+    def row(self, file):
+        row = self.index.get(file)
+        if row is None:
+            return None
+        if self.stale_from is not None and row >= self.stale_from:
+            self.reindex()
+            row = self.index[file]
+        return row
+
+    def remove(self, file):
+        row = self.row(file)
+        if row is None:
+            return None
+        del self.items[row]
+        del self.index[file]
+        self.stale_from = row if self.stale_from is None else min(self.stale_from, row)
+        return row
+
+    def remove_rows(self, first, last):
+        # Een aaneengesloten blok rijen in één keer, in plaats van per bestand opnieuw te nummeren
+        for file in self.items[first:last + 1]:
+            del self.index[file]
+        del self.items[first:last + 1]
+        self.stale_from = first if self.stale_from is None else min(self.stale_from, first)
+
+    def clear(self):
+        self.items = []
+        self.index = {}
+        self.stale_from = None
+
+    def reindex(self):
+        for row in range(self.stale_from, len(self.items)):
+            self.index[self.items[row]] = row
+        self.stale_from = None
@@ -0,0 +1,209 @@
+import io
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from engine import default_workers
+from profiling import ProfileCollector, profiled
+from stats import RunStats
+
+# Zoveel afgeronde jobs blijven opvraagbaar; daarna vallen de oudste af
+MAX_FINISHED_JOBS = 200
+# Uploads wachten als bytes in het geheugen op een werkproces; boven dit totaal worden nieuwe jobs geweigerd
+DEFAULT_MAX_QUEUED_BYTES = 512 * 1024 * 1024
+
+
+class QueueFull(Exception):
+    pass
+
+
+class PoolUnavailable(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, names):
+        self.id = uuid.uuid4().hex
+        self.created = time.time()
+        self.finished = None
+        self.files = [{"name": name, "status": "queued", "output": None, "error": None} for name in names]
+        self.futures = [None] * len(names)
+        # Indexen in de volgorde waarin ze klaar kwamen, voor wie op resultaten wacht (ZIP, voortgang)
+        self.completed = []
+        self.done = 0
+        self.errors = 0
+        # Opt-in: profiel van elke conversie, na afloop met een rapport in report_folder geschreven
+        self.collector = None
+        self.stats = RunStats(len(names))
+        self.report_folder = None
+        self.report = None
+
+    def is_finished(self):
+        return self.done == len(self.files)
+
+    def snapshot(self):
+        files = []
+        for entry, future in zip(self.files, self.futures):
+            entry = dict(entry)
+            if entry["status"] == "queued" and future is not None and future.running():
+                entry["status"] = "running"
+            files.append(entry)
+        running = self.done or any(file["status"] == "running" for file in files)
+        return {
+            "job": self.id,
+            "status": "done" if self.is_finished() else "running" if running else "queued",
+            **self.progress(),
+            "report": self.report,
+            "files": files,
+        }
+
+    def progress(self):
+        elapsed = (self.finished or time.time()) - self.created
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = len(self.files) - self.done
+        return {
+            "total": len(self.files),
+            "done": self.done,
+            "errors": self.errors,
+            "seconds": round(elapsed, 3),
+            "images_per_second": round(rate, 2),
+            "eta_seconds": round(remaining / rate, 1) if rate else None,
+        }
+
+
+class JobManager:
+    # Eén gedeelde procespool voor alle requests: de webworker neemt de upload aan, zet hem in de
+    # wachtrij en antwoordt meteen; het decoderen en schalen gebeurt buiten het requestproces
+    def __init__(self, workers=None, max_queued_bytes=DEFAULT_MAX_QUEUED_BYTES):
+        self.workers = workers or default_workers()
+        self.max_queued_bytes = max_queued_bytes
+        self.queued_bytes = 0
+        self.pool = None
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def submit(self, uploads, function, *args, job=None, report_folder=None):
+        # uploads: [(naam, bytes)]; function(bron, naam, *args) draait in een werkproces en geeft de uitvoernaam terug.
+        # Een vooraf gemaakte job geeft de aanroeper het id al voor het indienen (bijv. voor een eigen uitvoermap).
+        # Met report_folder wordt elke conversie geprofileerd en komen profiel en rapport daar als de job af is.
+        job = job or Job([name for name, _ in uploads])
+        if report_folder:
+            job.collector = ProfileCollector()
+            job.report_folder = report_folder
+        size = sum(len(data) for _, data in uploads)
+        with self.lock:
+            # Een lege wachtrij neemt altijd één job aan, anders zou een grote upload nooit aan de beurt komen
+            if self.queued_bytes and self.queued_bytes + size > self.max_queued_bytes:
+                raise QueueFull(f"{self.queued_bytes} bytes in de wachtrij")
+            self.queued_bytes += size
+            self.jobs[job.id] = job
+            self.expire()
+        for index, (name, data) in enumerate(uploads):
+            try:
+                if job.collector:
+                    future = self.submit_task(profiled, function, io.BytesIO(data), name, *args)
+                else:
+                    future = self.submit_task(function, io.BytesIO(data), name, *args)
+            except BrokenProcessPool as e:
+                if index == 0:
+                    # Nog niets ingediend: de job niet laten bestaan, zodat hij niet eeuwig 'queued' blijft
+                    with self.lock:
+                        self.queued_bytes -= size
+                        del self.jobs[job.id]
+                    raise PoolUnavailable(str(e)) from e
+                # Halverwege: de rest als mislukt afronden, zodat de job af komt en de bytes vrijkomen
+                future = Future()
+                future.set_exception(e)
+            job.futures[index] = future
+            future.add_done_callback(lambda future, index=index, size=len(data): self.complete(job, index, future, size))
+        return job
+
+    def submit_task(self, function, *args):
+        # Een gestorven werkproces (bijv. door de OOM-killer) maakt de hele pool voorgoed onbruikbaar;
+        # dan de oude afsluiten en het één keer opnieuw proberen met een nieuwe
+        for attempt in range(2):
+            with self.lock:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                pool = self.pool
+            try:
+                return pool.submit(function, *args)
+            except BrokenProcessPool:
+                with self.lock:
+                    if self.pool is pool:
+                        self.pool = None
+                pool.shutdown(wait=False)
+                if attempt:
+                    raise
+
+    def has_room(self, size):
+        # Vooraf, met de Content-Length: weigeren voordat de upload in het geheugen is gelezen
+        with self.lock:
+            return not self.queued_bytes or self.queued_bytes + size <= self.max_queued_bytes
+
+    def complete(self, job, index, future, size=0):
+        entry = job.files[index]
+        try:
+            result = future.result()
+            if job.collector:
+                result, profile_stats, peak = result
+                with self.lock:
+                    job.collector.add(profile_stats, entry["name"], peak)
+            entry["output"] = result
+            entry["status"] = "done"
+        except Exception as e:
+            entry["error"] = str(e)
+            entry["status"] = "error"
+        with self.lock:
+            self.queued_bytes -= size
+            job.futures[index] = None
+            job.stats.record(entry["name"], error=entry["error"])
+            finished = job.stats.done == len(job.files)
+        if finished and job.collector:
+            # Voor het melden dat de job af is, zodat wie op 'done' wacht het rapport al kan vinden
+            self.write_report(job)
+        with self.lock:
+            job.done += 1
+            job.errors += entry["status"] == "error"
+            job.completed.append(index)
+            if job.is_finished():
+                job.finished = time.time()
+            self.changed.notify_all()
+
+    def write_report(self, job):
+        try:
+            paths = job.collector.write(job.stats.report_base(job.report_folder))
+            job.report = job.stats.write(job.report_folder, profile=paths, memory=job.collector.memory_summary())
+        except OSError:
+            # Het rapport is een bijzaak; de conversies zelf zijn gelukt
+            pass
+
+    def iter_completed(self, job, timeout=None):
+        # Levert de bestanden van een job zodra ze klaar zijn (ook mislukte), tot de job af is.
+        # Met een timeout komt er None als er zo lang niets gebeurde (bijv. voor een keep-alive).
+        position = 0
+        while True:
+            with self.changed:
+                if position == len(job.completed) and not job.is_finished():
+                    self.changed.wait_for(lambda: position < len(job.completed) or job.is_finished(), timeout)
+                indexes = job.completed[position:]
+                position = len(job.completed)
+            for index in indexes:
+                yield job.files[index]
+            if not indexes:
+                if job.is_finished():
+                    return
+                yield None
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def expire(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished()]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job_id]
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = ".fotoconverter-manifest.json"
+# Pas herschrijven als het journaal minstens zo'n deel van het manifest beslaat; daaronder
+# zou elke kleine batch (map-bewaker) het hele manifest opnieuw wegschrijven
+COMPACT_RATIO = 0.25
+SAMPLE_SIZE = 64 * 1024
+
+
+def sample_offsets(size):
+    # Begin, midden en eind van het bestand; kleine bestanden volledig
+    if size <= 3 * SAMPLE_SIZE:
+        return [(0, size)]
+    return [(offset, SAMPLE_SIZE) for offset in (0, (size - SAMPLE_SIZE) // 2, size - SAMPLE_SIZE)]
+
+
+def fast_hash(file, size=None):
+    if size is None:
+        size = os.path.getsize(file)
+
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(file, "rb") as f:
+        for offset, length in sample_offsets(size):
+            f.seek(offset)
+            digest.update(f.read(length))
+    return digest.hexdigest()
+
+
+def fast_hash_data(data):
+    # Zelfde uitkomst als fast_hash, maar voor een bestand dat al in het geheugen staat
+    digest = hashlib.blake2b(str(len(data)).encode(), digest_size=16)
+    view = memoryview(data)
+    for offset, length in sample_offsets(len(data)):
+        digest.update(view[offset:offset + length])
+    return digest.hexdigest()
+
+
+def content_hash_data(data):
+    # Volledige inhoud, voor het herkennen van identieke bronnen; de bytes staan na het lezen toch in het geheugen
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+
+def settings_key(settings):
+    # Alles wat de uitvoer beïnvloedt, behalve de doelmap zelf
+    params = {
+        "renditions": [list(rendition) for rendition in settings.renditions],
+        "resize_quality": settings.resize_quality,
+        "jpeg_draft": settings.jpeg_draft,
+        # Een in skip-modus overgeslagen eigen uitvoer (zonder uitvoer vastgelegd) is bij passthrough of convert niet klaar
+        "own_outputs": settings.own_outputs,
+    }
+    return hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def output_stat(output_file):
+    stat = os.stat(output_file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def output_matches(output_file, expected_stat):
+    # De uitvoer moet nog precies het bestand zijn dat wij schreven, niet overschreven of weg
+    try:
+        return output_stat(output_file) == expected_stat
+    except OSError:
+        return False
+
+
+def entry_key(file, params):
+    return f"{os.path.abspath(file)}|{params}"
+
+
+class Manifest:
+    # Het manifest zelf wordt alleen in zijn geheel herschreven bij save(); tussendoor komt elke
+    # nieuwe vermelding als één regel achteraan in het journaal, dat bij het laden wordt nagespeeld
+    def __init__(self, target_directory):
+        self.path = os.path.join(target_directory, MANIFEST_NAME)
+        self.journal_path = self.path + ".journal"
+        self.journal = None
+        self.journal_entries = 0
+        self.entries = {}
+        self.dirty = False
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            # Geen of onleesbaar manifest: alles opnieuw converteren
+            self.entries = {}
+        self.replay()
+
+    def replay(self):
+        # Vermeldingen van een run die niet tot het einde kwam (afgebroken, gecrasht)
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        key, entry = json.loads(line)
+                    except ValueError:
+                        # Half geschreven laatste regel
+                        break
+                    self.entries[key] = entry
+                    self.journal_entries += 1
+        except OSError:
+            return
+        self.dirty = self.journal_entries > 0
+
+    def write_entry(self, key, entry):
+        self.entries[key] = entry
+        if self.journal is None:
+            self.journal = open(self.journal_path, "a", encoding="utf-8")
+        self.journal.write(json.dumps([key, entry]) + "\n")
+        self.journal_entries += 1
+        self.dirty = True
+
+    def flush(self):
+        # Goedkoop tussentijds checkpoint: alleen het journaal naar schijf
+        if self.journal:
+            self.journal.flush()
+
+    def lookup(self, file, params):
+        # Geeft de bestaande uitvoerbestanden terug als de bron niet veranderd is, anders None
+        entry = self.entries.get(entry_key(file, params))
+        if not entry:
+            return None
+        if not all(output_matches(output_file, output_stat) for output_file, output_stat in entry["outputs"]):
+            return None
+
+        stat = os.stat(file)
+        if stat.st_size != entry["size"]:
+            return None
+        if stat.st_mtime_ns != entry["mtime_ns"]:
+            # Alleen aangeraakt? Dan klopt de hash nog en is het bestand gelijk
+            if fast_hash(file, stat.st_size) != entry["hash"]:
+                return None
+            self.write_entry(entry_key(file, params), dict(entry, mtime_ns=stat.st_mtime_ns))
+        return [output_file for output_file, _ in entry["outputs"]]
+
+    def record(self, file, params, output_files, signature=None):
+        # signature: grootte, mtime en hash zoals bij het lezen bepaald; zonder wordt de bron opnieuw bekeken
+        if signature is None:
+            stat = os.stat(file)
+            signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": fast_hash(file, stat.st_size)}
+        self.write_entry(entry_key(file, params), {
+            **signature,
+            "outputs": [[output_file, output_stat(output_file)] for output_file in output_files],
+        })
+
+    def save(self, compact=False):
+        # Einde van een run: het journaal wegschrijven en, als het groot genoeg is geworden (of op verzoek),
+        # samenvoegen in het manifest. Zo kost een batch manifest-I/O naar verhouding van wat hij toevoegt.
+        self.flush()
+        if not self.dirty:
+            return
+        if not compact and self.journal_entries < COMPACT_RATIO * len(self.entries):
+            return
+
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        # Eerst naar een tijdelijk bestand, zodat een onderbreking het manifest niet beschadigt.
+        # Pas daarna het journaal weg; nogmaals naspelen na een crash hiertussen is onschadelijk.
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": self.entries}, f)
+        os.replace(temp_path, self.path)
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self.journal_entries = 0
+        self.dirty = False
@@ -5,6 +5,8 @@ import os
 import tkinterdnd2
 import threading
 import subprocess
+from engine import ConversionEngine, ConversionSettings
+from stats import PROGRESS_REFRESH_RATE
 
 class PhotoConverterApp:
     def __init__(self, master):
@@ -21,6 +23,9 @@ class PhotoConverterApp:
         # Variables
         self.source_files = []
         self.thumbnails = []
+        # (klaar, totaal), bijgewerkt door de conversiethread en periodiek getekend door Tk
+        self.progress_state = (0, 0)
+        self.converting = False
         self.size = (600, 600)  # Default size
 
         # Configure colors
@@ -213,54 +218,53 @@ class PhotoConverterApp:
         # Toon bezig-indicator
         self.status_label.config(text="Bezig met converteren...")
         self.progress_var.set(0)
+        self.progress_state = (0, len(self.source_files))
+        self.converting = True
+        self.master.after(int(1000 / PROGRESS_REFRESH_RATE), self.refresh_progress)
 
         # Start de conversie in een aparte thread
         threading.Thread(target=self.convert_photos, args=(self.target_directory,), daemon=True).start()
 
     def convert_photos(self, output_dir):
-        total_files = len(self.source_files)
-        target_width = int(self.width_entry.get())
-        target_height = int(self.height_entry.get())
-        
-        for i, file in enumerate(self.source_files):
-            try:
-                with Image.open(file) as img:
-                    # Bereken de bijsnijdafmetingen
-                    img_width, img_height = img.size
-                    aspect_ratio = img_width / img_height
-                    target_ratio = target_width / target_height
-
-                    if aspect_ratio > target_ratio:
-                        new_width = int(img_height * target_ratio)
-                        offset = (img_width - new_width) // 2
-                        crop_box = (offset, 0, offset + new_width, img_height)
-                    else:
-                        new_height = int(img_width / target_ratio)
-                        offset = (img_height - new_height) // 2
-                        crop_box = (0, offset, img_width, offset + new_height)
-
-                    img_cropped = img.crop(crop_box)
-                    img_resized = img_cropped.resize((target_width, target_height), Image.LANCZOS)
-
-                    # Maak een nieuwe bestandsnaam voor de geconverteerde afbeelding
-                    base_name = os.path.splitext(os.path.basename(file))[0]
-                    output_file = os.path.join(output_dir, f"{base_name}_converted.png")
-                    img_resized.save(output_file, "PNG")
-                
-                progress = (i + 1) / total_files * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Verwerkt: {i+1}/{total_files}")
-                self.master.update_idletasks()
-
-            except Exception as e:
-                print(f"Fout bij het converteren van {file}: {str(e)}")
-
-        # Na conversie, herstel de knoppen en update status
-        self.master.after(0, self.finish_conversion)
-
-    def finish_conversion(self):
+        error = None
+        try:
+            target_width = int(self.width_entry.get())
+            target_height = int(self.height_entry.get())
+
+            settings = ConversionSettings(output_dir, target_width, target_height)
+            ConversionEngine(settings).run(self.source_files, on_result=self.report_result)
+        except Exception as e:
+            error = str(e)
+        finally:
+            # Na conversie (ook een mislukte), herstel de knoppen en update status
+            self.master.after(0, self.finish_conversion, error)
+
+    def report_result(self, done, total_files, file, output_files, error):
+        # Draait in de conversiethread: alleen de stand bijhouden, Tk-widgets horen bij de hoofdthread
+        if error:
+            print(f"Fout bij het converteren van {file}: {error}")
+        self.progress_state = (done, total_files)
+
+    def refresh_progress(self):
+        # Vaste verversing, hoeveel bestanden er ook per seconde klaar zijn
+        if not self.converting:
+            return
+        done, total_files = self.progress_state
+        if total_files:
+            self.progress_var.set(done / total_files * 100)
+            self.status_label.config(text=f"Verwerkt: {done}/{total_files}")
+        self.master.after(int(1000 / PROGRESS_REFRESH_RATE), self.refresh_progress)
+
+    def finish_conversion(self, error=None):
+        self.converting = False
         self.convert_button.config(state=tk.NORMAL)
         self.select_files_button.config(state=tk.NORMAL)
+        if error:
+            # De wachtrij blijft staan, zodat opnieuw proberen kan
+            self.status_label.config(text="Conversie mislukt")
+            messagebox.showerror("Conversie mislukt", f"De conversie is afgebroken:\n{error}")
+            return
+        self.progress_var.set(100)
         self.status_label.config(text="Conversie voltooid!")
         
         total_files = len(self.source_files)
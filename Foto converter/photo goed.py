@@ -1,65 +1,237 @@
 import sys
 import os
+import time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QLabel, QFileDialog, QProgressBar, QScrollArea,
-                             QLineEdit, QMessageBox, QFrame, QDialog)
-from PyQt6.QtGui import QPixmap, QImage, QDragEnterEvent, QDropEvent, QIcon, QPainter, QColor
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSize
-from PIL import Image
+                             QPushButton, QLabel, QFileDialog, QProgressBar,
+                             QLineEdit, QMessageBox, QFrame, QDialog, QComboBox, QCheckBox,
+                             QListView, QAbstractItemView)
+from PyQt6.QtGui import (QPixmap, QImage, QDragEnterEvent, QDropEvent, QIcon, QPainter, QColor,
+                         QKeySequence, QShortcut)
+from PyQt6.QtCore import (Qt, QThread, pyqtSignal, QSize, QObject, QRunnable, QThreadPool,
+                          QAbstractListModel, QModelIndex)
+from collections import OrderedDict
 import subprocess
+from engine import ConversionEngine, ConversionSettings, default_workers, parse_renditions
+from encoders import DEFAULT_PROFILE, available_profiles, profile_label
+from stats import ProgressThrottle, format_duration
+from file_queue import FileQueue
+from scanner import iter_image_files
+from thumbnails import THUMBNAIL_SIZE, load_thumbnail
 
 class ConversionThread(QThread):
     progress = pyqtSignal(int)
     status = pyqtSignal(str)
     finished = pyqtSignal()
 
-    def __init__(self, source_files, target_directory, target_width, target_height):
+    def __init__(self, source_files, target_directory, target_width, target_height, workers=None,
+                 resize_quality="balanced", profile=DEFAULT_PROFILE, renditions=None, profiling=False):
         super().__init__()
         self.source_files = source_files
         self.target_directory = target_directory
         self.target_width = target_width
         self.target_height = target_height
+        self.workers = workers
+        self.resize_quality = resize_quality
+        self.profile = profile
+        self.renditions = renditions
+        self.profiling = profiling
+        # Al hier aangemaakt, zodat pauzeren en annuleren ook werken voordat run() begonnen is
+        settings = ConversionSettings(self.target_directory, self.target_width, self.target_height,
+                                      resize_quality=self.resize_quality, profile=self.profile,
+                                      renditions=self.renditions)
+        self.engine = ConversionEngine(settings, workers=self.workers, profiling=self.profiling)
+        self.summary = {}
+        # Hooguit PROGRESS_REFRESH_RATE signalen per seconde, ook bij 100.000 kleine foto's
+        self.throttle = ProgressThrottle()
+
+    def pause(self):
+        self.engine.pause()
+        self.status.emit("Gepauzeerd: lopende foto's worden nog afgemaakt...")
+
+    def resume(self):
+        self.engine.resume()
+        self.status.emit("Hervat")
+
+    def cancel(self):
+        self.engine.cancel()
+        self.status.emit("Annuleren: lopende foto's worden nog afgemaakt...")
 
     def run(self):
-        total_files = len(self.source_files)
-        for i, file in enumerate(self.source_files):
-            try:
-                with Image.open(file) as img:
-                    img_width, img_height = img.size
-                    aspect_ratio = img_width / img_height
-                    target_ratio = self.target_width / self.target_height
-
-                    if aspect_ratio > target_ratio:
-                        new_width = int(img_height * target_ratio)
-                        offset = (img_width - new_width) // 2
-                        crop_box = (offset, 0, offset + new_width, img_height)
-                    else:
-                        new_height = int(img_width / target_ratio)
-                        offset = (img_height - new_height) // 2
-                        crop_box = (0, offset, img_width, offset + new_height)
-
-                    img_cropped = img.crop(crop_box)
-                    img_resized = img_cropped.resize((self.target_width, self.target_height), Image.LANCZOS)
-
-                    base_name = os.path.splitext(os.path.basename(file))[0]
-                    output_file = os.path.join(self.target_directory, f"{base_name}_converted.png")
-                    img_resized.save(output_file, "PNG")
-                
-                progress = int((i + 1) / total_files * 100)
-                self.progress.emit(progress)
-                self.status.emit(f"Verwerkt: {i+1}/{total_files}")
-
-            except Exception as e:
-                self.status.emit(f"Fout bij het converteren van {file}: {str(e)}")
-
-        self.finished.emit()
+        try:
+            self.engine.run(self.source_files, on_result=self.forward_result)
+            self.summary = dict(self.engine.summary(), done=self.engine.stats.done, errors=len(self.engine.stats.errors),
+                                report=self.engine.report_path, profile=self.engine.profile_paths.get("pstats"))
+        except Exception as e:
+            # Fout van de engine zelf (bijv. doelmap weg, procespool gestorven): melden, niet de thread laten sterven
+            self.summary = dict(self.engine.summary(), done=self.engine.stats.done, failed=str(e))
+        finally:
+            # Altijd, anders blijft het modale laadvenster voorgoed openstaan
+            self.finished.emit()
+
+    def forward_result(self, done, total_files, file, output_files, error):
+        if error:
+            error = f"{os.path.basename(file)}: {error}"
+        if not self.throttle.update(done, total_files, error):
+            return
+
+        progress = int(done / total_files * 100)
+        self.progress.emit(progress)
+        stats = self.engine.stats
+        message = (f"Verwerkt: {done}/{total_files} ({stats.images_per_second():.1f} foto's/s, "
+                   f"nog {format_duration(stats.eta())})")
+        if self.throttle.errors:
+            message += f"\n{self.throttle.errors} fouten, laatste: {self.throttle.last_error}"
+        self.status.emit(message)
+
+# Gevonden bestanden gaan per blok naar de wachtrij: na zoveel bestanden of zoveel seconden
+SCAN_CHUNK_SIZE = 500
+SCAN_CHUNK_SECONDS = 0.2
+
+class ScanThread(QThread):
+    # Doorloopt gesleepte mappen recursief (os.scandir) buiten de GUI-thread
+    found = pyqtSignal(list)
+    done = pyqtSignal(int)
+
+    def __init__(self, paths, sniff=False, exclude=None):
+        super().__init__()
+        self.paths = paths
+        self.sniff = sniff
+        self.exclude = exclude
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        chunk = []
+        total = 0
+        last_emit = time.monotonic()
+        for file in iter_image_files(self.paths, exclude=self.exclude, sniff=self.sniff):
+            if self.stopped:
+                break
+            chunk.append(file)
+            total += 1
+            now = time.monotonic()
+            if len(chunk) >= SCAN_CHUNK_SIZE or now - last_emit >= SCAN_CHUNK_SECONDS:
+                self.found.emit(chunk)
+                chunk = []
+                last_emit = now
+        if chunk:
+            self.found.emit(chunk)
+        self.done.emit(total)
+
+class ThumbnailSignals(QObject):
+    ready = pyqtSignal(str, QImage)
+
+class ThumbnailTask(QRunnable):
+    # Decodeert (verkleind) en cachet in een QThreadPool; QImage mag buiten de GUI-thread, QPixmap niet
+    def __init__(self, file, signals):
+        super().__init__()
+        self.file = file
+        self.signals = signals
+
+    def run(self):
+        try:
+            data = load_thumbnail(self.file)
+        except Exception:
+            # Onleesbaar bestand: de placeholder blijft staan, de conversie meldt de fout later
+            return
+        self.signals.ready.emit(self.file, QImage.fromData(data))
+
+# Zoveel thumbnails blijven als QPixmap in het geheugen; de rest komt bij terugscrollen uit de schijfcache
+THUMBNAIL_MEMORY_LIMIT = 2000
+
+class FileQueueModel(QAbstractListModel):
+    # De view vraagt alleen zichtbare rijen op, dus ook thumbnails worden alleen daarvoor gemaakt
+    def __init__(self, thumbnail_pool, placeholder, parent=None):
+        super().__init__(parent)
+        self.files = FileQueue()
+        self.thumbnail_pool = thumbnail_pool
+        self.placeholder = placeholder
+        self.thumbnails = OrderedDict()
+        self.requested = set()
+        self.signals = ThumbnailSignals()
+        self.signals.ready.connect(self.set_thumbnail)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.files)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        file = self.files[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(file)
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.thumbnail(file)
+        if role in (Qt.ItemDataRole.ToolTipRole, Qt.ItemDataRole.UserRole):
+            return file
+        return None
+
+    def thumbnail(self, file):
+        pixmap = self.thumbnails.get(file)
+        if pixmap is not None:
+            self.thumbnails.move_to_end(file)
+            return pixmap
+        if file not in self.requested:
+            self.requested.add(file)
+            self.thumbnail_pool.start(ThumbnailTask(file, self.signals))
+        return self.placeholder
+
+    def set_thumbnail(self, file, img):
+        row = self.files.row(file)
+        # Onleesbaar bestand blijft 'aangevraagd', zodat het niet steeds opnieuw geprobeerd wordt
+        if row is None or img.isNull():
+            return
+        self.requested.discard(file)
+        self.thumbnails[file] = QPixmap.fromImage(img)
+        if len(self.thumbnails) > THUMBNAIL_MEMORY_LIMIT:
+            self.thumbnails.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def add_files(self, files):
+        files = [file for file in dict.fromkeys(files) if file not in self.files]
+        if not files:
+            return 0
+        first = len(self.files)
+        self.beginInsertRows(QModelIndex(), first, first + len(files) - 1)
+        self.files.add(files)
+        self.endInsertRows()
+        return len(files)
+
+    def remove_rows(self, rows):
+        # Van achter naar voren, per aaneengesloten blok één keer rijen verwijderen
+        rows = sorted(set(rows), reverse=True)
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            for file in self.files.items[first:last + 1]:
+                self.thumbnails.pop(file, None)
+                self.requested.discard(file)
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self.files.remove_rows(first, last)
+            self.endRemoveRows()
+
+    def remove_file(self, file):
+        row = self.files.row(file)
+        if row is not None:
+            self.remove_rows([row])
+
+    def clear(self):
+        self.beginResetModel()
+        self.files.clear()
+        self.thumbnails.clear()
+        self.requested.clear()
+        self.endResetModel()
 
 class LoadingDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Bezig met converteren...")
         self.setModal(True)
-        self.setFixedSize(200, 100)
+        self.setFixedSize(260, 130)
 
         layout = QVBoxLayout(self)
         self.label = QLabel("Bezig met converteren...")
@@ -69,14 +241,30 @@ class LoadingDialog(QDialog):
         self.progress_bar.setRange(0, 0)  # Indeterminate progress
         layout.addWidget(self.progress_bar)
 
+        button_layout = QHBoxLayout()
+        self.pause_btn = QPushButton("Pauzeren")
+        self.cancel_btn = QPushButton("Annuleren")
+        button_layout.addWidget(self.pause_btn)
+        button_layout.addWidget(self.cancel_btn)
+        layout.addLayout(button_layout)
+
 class PhotoConverterApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Foto Converter")
         self.setGeometry(100, 100, 1000, 700)
 
-        self.source_files = []
         self.target_directory = ""
+        self.scan_threads = []
+
+        # Thumbnails worden op de achtergrond gemaakt; tot dan staat er een grijze placeholder
+        self.thumbnail_pool = QThreadPool()
+        self.thumbnail_pool.setMaxThreadCount(max(2, default_workers() // 2))
+        self.placeholder_pixmap = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self.placeholder_pixmap.fill(QColor("#d0d0d0"))
+        self.file_model = FileQueueModel(self.thumbnail_pool, self.placeholder_pixmap, self)
+        # Geordende wachtrij met index: 'staat het er al in' is O(1)
+        self.source_files = self.file_model.files
 
         self.init_ui()
 
@@ -114,16 +302,21 @@ class PhotoConverterApp(QMainWindow):
         left_layout.addWidget(self.drop_zone)
 
         # Foto informatie veld
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setStyleSheet("""
-            QScrollArea {
+        # Virtuele lijst: alleen zichtbare rijen worden getekend, ook bij tienduizenden bestanden
+        self.file_list = QListView()
+        self.file_list.setModel(self.file_model)
+        self.file_list.setUniformItemSizes(True)
+        self.file_list.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.file_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.file_list.setStyleSheet("""
+            QListView {
                 background-color: transparent;
                 border: 2px solid #1E1E1E;
                 border-radius: 10px;
             }
-            QScrollArea > QWidget > QWidget {
-                background-color: transparent;
+            QListView::item {
+                padding: 5px;
+                color: #1E1E1E;
             }
             QScrollBar:vertical {
                 border: none;
@@ -157,12 +350,8 @@ class PhotoConverterApp(QMainWindow):
                 background: none;
             }
         """)
-        self.thumbnails_widget = QWidget()
-        self.thumbnails_layout = QVBoxLayout(self.thumbnails_widget)
-        self.thumbnails_layout.setSpacing(5)
-        self.thumbnails_layout.setContentsMargins(5, 5, 5, 5)
-        self.scroll_area.setWidget(self.thumbnails_widget)
-        left_layout.addWidget(self.scroll_area)
+        QShortcut(QKeySequence(Qt.Key.Key_Delete), self.file_list, activated=self.remove_selected_files)
+        left_layout.addWidget(self.file_list)
 
         main_layout.addWidget(left_widget, 2)
 
@@ -174,6 +363,17 @@ class PhotoConverterApp(QMainWindow):
         self.select_files_btn.clicked.connect(self.select_files)
         right_layout.addWidget(self.select_files_btn)
 
+        self.select_folder_btn = QPushButton("Selecteer Map")
+        self.select_folder_btn.clicked.connect(self.select_folder)
+        right_layout.addWidget(self.select_folder_btn)
+
+        self.sniff_input = QCheckBox("Foto's herkennen aan inhoud i.p.v. extensie")
+        right_layout.addWidget(self.sniff_input)
+
+        self.remove_selected_btn = QPushButton("Verwijder Selectie")
+        self.remove_selected_btn.clicked.connect(self.remove_selected_files)
+        right_layout.addWidget(self.remove_selected_btn)
+
         self.select_dir_btn = QPushButton("Selecteer Doelmap")
         self.select_dir_btn.clicked.connect(self.select_directory)
         right_layout.addWidget(self.select_dir_btn)
@@ -191,6 +391,28 @@ class PhotoConverterApp(QMainWindow):
         size_layout.addWidget(self.height_input)
         right_layout.addLayout(size_layout)
 
+        self.extra_sizes_input = QLineEdit()
+        self.extra_sizes_input.setPlaceholderText("Extra formaten, bijv. 1200x1200, 150x150:webp")
+        right_layout.addWidget(self.extra_sizes_input)
+
+        self.workers_input = QLineEdit()
+        self.workers_input.setPlaceholderText(f"Processen (standaard {default_workers()})")
+        right_layout.addWidget(self.workers_input)
+
+        self.quality_input = QComboBox()
+        self.quality_input.addItem("Gebalanceerd", "balanced")
+        self.quality_input.addItem("Snelste", "fast")
+        self.quality_input.addItem("Beste kwaliteit", "best")
+        right_layout.addWidget(self.quality_input)
+
+        self.profile_input = QComboBox()
+        for profile in available_profiles():
+            self.profile_input.addItem(profile_label(profile), profile)
+        right_layout.addWidget(self.profile_input)
+
+        self.profiling_input = QCheckBox("Profileren (trager, schrijft een profiel naast het rapport)")
+        right_layout.addWidget(self.profiling_input)
+
         self.convert_btn = QPushButton("Converteer Foto's")
         self.convert_btn.clicked.connect(self.start_conversion)
         right_layout.addWidget(self.convert_btn)
@@ -265,57 +487,39 @@ class PhotoConverterApp(QMainWindow):
         files, _ = QFileDialog.getOpenFileNames(self, "Selecteer Bestanden", "", "Image files (*.jpg *.jpeg *.png)")
         self.add_files(files)
 
-    def add_files(self, files):
-        for file in files:
-            if file not in self.source_files:
-                self.source_files.append(file)
-                self.add_thumbnail(file)
-
-    def add_thumbnail(self, file):
-        thumbnail_widget = QWidget()
-        thumbnail_layout = QHBoxLayout(thumbnail_widget)
-
-        img = QImage(file)
-        pixmap = QPixmap.fromImage(img).scaled(50, 50, Qt.AspectRatioMode.KeepAspectRatio)
-        thumbnail_label = QLabel()
-        thumbnail_label.setPixmap(pixmap)
-        thumbnail_layout.addWidget(thumbnail_label)
-
-        file_name = os.path.basename(file)
-        name_label = QLabel(file_name)
-        name_label.setStyleSheet("color: #1E1E1E;")
-        thumbnail_layout.addWidget(name_label, 1)
+    def select_folder(self):
+        directory = QFileDialog.getExistingDirectory(self, "Selecteer Map met Foto's")
+        if directory:
+            self.scan_paths([directory])
+
+    def scan_paths(self, paths):
+        # Bestanden en mappen; de doelmap zelf wordt overgeslagen
+        scan_thread = ScanThread(paths, sniff=self.sniff_input.isChecked(), exclude=self.target_directory or None)
+        scan_thread.found.connect(self.add_scanned_files)
+        scan_thread.done.connect(lambda total, t=scan_thread: self.scan_finished(t, total))
+        self.scan_threads.append(scan_thread)
+        self.status_label.setText("Mappen doorzoeken...")
+        scan_thread.start()
+
+    def add_scanned_files(self, files):
+        self.add_files(files)
+        self.status_label.setText(f"Mappen doorzoeken... {len(self.source_files)} foto's in de wachtrij")
 
-        remove_btn = QPushButton("X")
-        remove_btn.setStyleSheet("background-color: #ff4d4d; max-width: 30px;")
-        remove_btn.clicked.connect(lambda _, f=file: self.on_remove_button_clicked(f))  # Verander hier de connectie
-        thumbnail_layout.addWidget(remove_btn)
+    def scan_finished(self, scan_thread, total):
+        scan_thread.wait()
+        self.scan_threads.remove(scan_thread)
+        if not self.scan_threads:
+            self.status_label.setText(f"{len(self.source_files)} foto's in de wachtrij")
 
-        self.thumbnails_layout.addWidget(thumbnail_widget)
+    def add_files(self, files):
+        self.file_model.add_files(files)
 
-    def on_remove_button_clicked(self, file):
-        print(f"Verwijderknop ingedrukt voor: {file}")  # Debugging-uitvoer
-        self.remove_file(file)
+    def remove_selected_files(self):
+        rows = [index.row() for index in self.file_list.selectionModel().selectedRows()]
+        self.file_model.remove_rows(rows)
 
     def remove_file(self, file):
-        print(f"Probeer bestand te verwijderen: {file}")  # Debugging-uitvoer
-        print(f"Huidige source_files: {self.source_files}")  # Debugging-uitvoer
-
-        if file in self.source_files:  # Controleer of het bestand in de lijst staat
-            self.source_files.remove(file)
-            print(f"Bestand verwijderd: {file}")  # Debugging-uitvoer
-
-            # Verwijder de thumbnail widget
-            for i in reversed(range(self.thumbnails_layout.count())): 
-                widget = self.thumbnails_layout.itemAt(i).widget()
-                # Controleer of de naam overeenkomt
-                name_label = widget.findChildren(QLabel)[1]  # Neem de juiste QLabel
-                if name_label.text() == os.path.basename(file):  # Vergelijk met de bestandsnaam
-                    widget.setParent(None)  # Verwijder de widget uit de lay-out
-                    print(f"Thumbnail verwijderd voor: {file}")  # Debugging-uitvoer
-                    break
-        else:
-            print(f"Bestand niet gevonden in source_files: {file}")  # Debugging-uitvoer
+        self.file_model.remove_file(file)
 
     def select_directory(self):
         self.target_directory = QFileDialog.getExistingDirectory(self, "Selecteer Doelmap")
@@ -325,6 +529,10 @@ class PhotoConverterApp(QMainWindow):
             self.dir_label.setText("Geen map geselecteerd")
 
     def start_conversion(self):
+        if self.scan_threads:
+            QMessageBox.warning(self, "Nog bezig", "Wacht tot alle mappen doorzocht zijn.")
+            return
+
         if not self.source_files:
             QMessageBox.warning(self, "Geen bestanden", "Selecteer eerst enkele foto's om te converteren.")
             return
@@ -340,19 +548,59 @@ class PhotoConverterApp(QMainWindow):
             QMessageBox.warning(self, "Ongeldige afmetingen", "Voer geldige getallen in voor breedte en hoogte.")
             return
 
+        profile = self.profile_input.currentData()
+        try:
+            renditions = [(target_width, target_height, profile)]
+            renditions += parse_renditions(self.extra_sizes_input.text(), profile)
+        except ValueError as e:
+            QMessageBox.warning(self, "Ongeldige extra formaten", f"Controleer de extra formaten: {e}")
+            return
+
+        try:
+            workers = int(self.workers_input.text()) if self.workers_input.text() else None
+        except ValueError:
+            QMessageBox.warning(self, "Ongeldig aantal processen", "Voer een geldig getal in voor het aantal processen.")
+            return
+
         self.convert_btn.setEnabled(False)
         self.select_files_btn.setEnabled(False)
         self.select_dir_btn.setEnabled(False)
 
         self.loading_dialog = LoadingDialog(self)
+        self.loading_dialog.pause_btn.clicked.connect(self.toggle_pause)
+        self.loading_dialog.cancel_btn.clicked.connect(self.cancel_conversion)
+        # Sluiten van het venster (of Esc) betekent annuleren
+        self.loading_dialog.rejected.connect(self.cancel_conversion)
         self.loading_dialog.show()
 
-        self.conversion_thread = ConversionThread(self.source_files, self.target_directory, target_width, target_height)
+        # Een momentopname: de wachtrij kan tijdens de conversie niet meer veranderen
+        self.conversion_thread = ConversionThread(list(self.source_files), self.target_directory, target_width, target_height, workers,
+                                                  resize_quality=self.quality_input.currentData(),
+                                                  profile=profile, renditions=renditions,
+                                                  profiling=self.profiling_input.isChecked())
         self.conversion_thread.progress.connect(self.update_progress)
         self.conversion_thread.status.connect(self.update_status)
         self.conversion_thread.finished.connect(self.conversion_finished)
         self.conversion_thread.start()
 
+    def toggle_pause(self):
+        if self.conversion_thread.engine.is_paused():
+            self.conversion_thread.resume()
+            self.loading_dialog.pause_btn.setText("Pauzeren")
+            self.loading_dialog.label.setText("Bezig met converteren...")
+        else:
+            self.conversion_thread.pause()
+            self.loading_dialog.pause_btn.setText("Hervatten")
+            self.loading_dialog.label.setText("Gepauzeerd")
+
+    def cancel_conversion(self):
+        self.conversion_thread.cancel()
+        self.loading_dialog.pause_btn.setEnabled(False)
+        self.loading_dialog.cancel_btn.setEnabled(False)
+        self.loading_dialog.label.setText("Annuleren...")
+        # Open houden tot de lopende foto's klaar zijn; conversion_finished sluit het venster
+        self.loading_dialog.show()
+
     def update_progress(self, value):
         self.progress_bar.setValue(value)
         self.progress_percentage.setText(f"{value}%")
@@ -361,19 +609,52 @@ class PhotoConverterApp(QMainWindow):
         self.status_label.setText(message)
 
     def conversion_finished(self):
-        self.loading_dialog.close()
+        # accept() in plaats van close(): close() zou rejected uitzenden en dus annuleren
+        self.loading_dialog.accept()
         self.convert_btn.setEnabled(True)
         self.select_files_btn.setEnabled(True)
         self.select_dir_btn.setEnabled(True)
+        if self.conversion_thread.summary.get("failed"):
+            self.status_label.setText("Conversie mislukt")
+            QMessageBox.critical(self, "Conversie mislukt",
+                                 f"De conversie is afgebroken na {self.conversion_thread.summary.get('done', 0)} "
+                                 f"van {len(self.source_files)} foto's:\n{self.conversion_thread.summary['failed']}")
+            return
+        if self.conversion_thread.summary.get("cancelled"):
+            self.status_label.setText("Conversie geannuleerd")
+            self.show_cancelled_message()
+            return
         self.status_label.setText("Conversie voltooid!")
         self.show_completion_message()
 
+    def show_cancelled_message(self):
+        summary = self.conversion_thread.summary
+        # De wachtrij blijft staan: opnieuw converteren slaat via het manifest over wat al klaar is
+        QMessageBox.information(self, "Conversie geannuleerd",
+                                f"De conversie is gestopt na {summary.get('done', 0)} van {len(self.source_files)} foto's.\n"
+                                "Klik opnieuw op 'Converteer Foto's' om verder te gaan; "
+                                "foto's die al klaar zijn worden overgeslagen.")
+
     def show_completion_message(self):
         total_files = len(self.source_files)
         width = self.width_input.text()
         height = self.height_input.text()
         
-        message = f"Alle {total_files} foto's zijn geconverteerd naar PNG en bijgesneden naar {width}x{height}.\n"
+        profile = profile_label(self.profile_input.currentData())
+        message = f"Alle {total_files} foto's zijn geconverteerd naar {profile} en bijgesneden naar {width}x{height}.\n"
+        summary = self.conversion_thread.summary
+        if summary.get("skipped"):
+            message += f"{summary['skipped']} foto's waren al up-to-date en zijn overgeslagen.\n"
+        if summary.get("duplicates"):
+            megabytes = summary["bytes_saved"] / (1024 * 1024)
+            message += (f"{summary['duplicates']} dubbele foto's zijn gelinkt in plaats van opnieuw geconverteerd "
+                        f"(bespaard: {megabytes:.1f} MB, ongeveer {summary['seconds_saved']:.0f} s).\n")
+        if summary.get("errors"):
+            message += f"{summary['errors']} foto's konden niet worden geconverteerd.\n"
+        if summary.get("report"):
+            message += f"Rapport: {summary['report']}\n"
+        if summary.get("profile"):
+            message += f"Profiel: {summary['profile']}\n"
         message += "De geüploade foto's zijn automatisch verwijderd. U kunt nu nieuwe foto's uploaden."
         
         msg_box = QMessageBox(self)
@@ -398,17 +679,19 @@ class PhotoConverterApp(QMainWindow):
             subprocess.call(['xdg-open', self.target_directory])
 
     def remove_all_files(self):
-        self.source_files.clear()
-        for i in reversed(range(self.thumbnails_layout.count())): 
-            self.thumbnails_layout.itemAt(i).widget().setParent(None)
+        # Nog niet gestarte thumbnails zijn niet meer nodig
+        self.thumbnail_pool.clear()
+        self.file_model.clear()
 
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
 
     def dropEvent(self, event: QDropEvent):
-        files = [u.toLocalFile() for u in event.mimeData().urls() if u.toLocalFile().lower().endswith(('.jpg', '.jpeg', '.png'))]
-        self.add_files(files)
+        # Losse bestanden en hele mappen; het filteren en doorzoeken gebeurt op de achtergrond
+        paths = [u.toLocalFile() for u in event.mimeData().urls() if u.isLocalFile()]
+        if paths:
+            self.scan_paths(paths)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
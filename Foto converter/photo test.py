@@ -1,16 +1,49 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import (Flask, render_template, request, redirect, url_for, flash, send_from_directory, jsonify,
+                   Response, abort, stream_with_context)
+import json
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 import os
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
+
+from encoders import DEFAULT_PROFILE, available_profiles, encode, profile_extension, profile_mimetype
+from jobs import DEFAULT_MAX_QUEUED_BYTES, Job, JobManager, PoolUnavailable, QueueFull
+from rendition_cache import (DEFAULT_DISK_BYTES, DEFAULT_MEMORY_BYTES, RenditionCache, render_rendition,
+                             rendition_key)
+from singleflight import SingleFlight
+from zipstream import stream_zip, unique_arcnames
+from profiling import ProfileCollector
+from stats import RunStats
+from web_uploads import configure_uploads, keep_original
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # Voor flash berichten
+# Uploads worden rechtstreeks uit de (in het geheugen gebufferde) requeststroom geconverteerd
+configure_uploads(app)
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Profileren voor elke upload aanzetten met FOTOCONVERTER_PROFILING=1, of per upload via het formulier
+app.config['PROFILING'] = os.environ.get('FOTOCONVERTER_PROFILING') == '1'
+# Gedeelde procespool voor /jobs; FOTOCONVERTER_WORKERS beperkt het aantal processen en
+# FOTOCONVERTER_MAX_QUEUED_BYTES hoeveel uploadbytes er samen in het geheugen op een proces mogen wachten
+jobs = JobManager(int(os.environ['FOTOCONVERTER_WORKERS']) if os.environ.get('FOTOCONVERTER_WORKERS') else None,
+                  int(os.environ.get('FOTOCONVERTER_MAX_QUEUED_BYTES', DEFAULT_MAX_QUEUED_BYTES)))
+# Zo lang wacht een client die 503 kreeg voordat hij het opnieuw probeert
+QUEUE_RETRY_AFTER_SECONDS = 5
+
+# Formaten op aanvraag (/images/<naam>?w=..&h=..&format=..): bronnen uit ORIGINALS_FOLDER, resultaten in
+# een LRU in het geheugen met daaronder een begrensde cache op schijf
+app.config['RESIZE_MAX_SIZE'] = 4000
+app.config['RESIZE_MAX_AGE'] = int(os.environ.get('FOTOCONVERTER_RESIZE_MAX_AGE', 3600))
+renditions = RenditionCache(os.environ.get('FOTOCONVERTER_RENDITION_CACHE', 'rendition-cache'),
+                            memory_bytes=int(os.environ.get('FOTOCONVERTER_MEMORY_CACHE_BYTES', DEFAULT_MEMORY_BYTES)),
+                            disk_bytes=int(os.environ.get('FOTOCONVERTER_DISK_CACHE_BYTES', DEFAULT_DISK_BYTES)))
+# Tegelijke aanvragen voor hetzelfde, nog niet gecachete formaat: één request rekent, de rest wacht mee
+rendition_flights = SingleFlight()
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', profiles=available_profiles())
 
 @app.route('/upload', methods=['POST'])
 def upload_files():
@@ -21,32 +54,221 @@ def upload_files():
     files = request.files.getlist('files')
     target_width = int(request.form['width'])
     target_height = int(request.form['height'])
+    profile = request.form.get('profile', DEFAULT_PROFILE)
+    if profile not in available_profiles():
+        flash('Onbekend uitvoerprofiel')
+        return redirect(request.url)
     converted_files = []  # Lijst om geconverteerde bestandsnamen op te slaan
+    collector = ProfileCollector() if app.config['PROFILING'] or request.form.get('profiling') else None
+    stats = RunStats(len(files))
 
     for file in files:
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
-            converted_filename = convert_image(file_path, target_width, target_height)
+            if collector:
+                converted_filename = collector.profile(filename, convert_image, file.stream, filename,
+                                                       target_width, target_height, profile)
+            else:
+                converted_filename = convert_image(file.stream, filename, target_width, target_height, profile)
+            if app.config['KEEP_ORIGINALS']:
+                keep_original(file, app.config['ORIGINALS_FOLDER'], filename)
+            stats.record(filename)
             converted_files.append(converted_filename)  # Voeg de geconverteerde bestandsnaam toe
 
+    if collector:
+        paths = collector.write(stats.report_base(UPLOAD_FOLDER))
+        report_path = stats.write(UPLOAD_FOLDER, profile=paths, memory=collector.memory_summary())
+        flash(f'Profiel geschreven naast het rapport: {report_path}')
+
     flash('Bestanden succesvol geüpload en geconverteerd!')
-    return render_template('index.html', converted_files=converted_files)  # Geef de geconverteerde bestanden door aan de template
+    return render_template('index.html', converted_files=converted_files, profiles=available_profiles())  # Geef de geconverteerde bestanden door aan de template
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    # Zelfde formulier als /upload, maar de conversie gebeurt op de achtergrond: meteen een job-id terug
+    if not jobs.has_room(request.content_length or 0):
+        return service_unavailable('Te veel uploads in de wachtrij, probeer het zo opnieuw')
+    files = [file for file in request.files.getlist('files') if file and allowed_file(file.filename)]
+    if not files:
+        return jsonify(error='Geen geldige bestanden geselecteerd'), 400
+    try:
+        target_width = int(request.form['width'])
+        target_height = int(request.form['height'])
+    except (KeyError, ValueError):
+        return jsonify(error='Ongeldige breedte of hoogte'), 400
+    profile = request.form.get('profile', DEFAULT_PROFILE)
+    if profile not in available_profiles():
+        return jsonify(error='Onbekend uitvoerprofiel'), 400
+
+    uploads = []
+    for file, filename in zip(files, unique_stems(secure_filename(file.filename) for file in files)):
+        # De uploadstroom sluit met het request; de bytes gaan mee naar het werkproces
+        uploads.append((filename, file.read()))
+        if app.config['KEEP_ORIGINALS']:
+            keep_original(file, app.config['ORIGINALS_FOLDER'], filename)
+
+    # Elke job schrijft in zijn eigen map, zodat gelijknamige uploads van andere jobs niets overschrijven
+    job = Job([filename for filename, _ in uploads])
+    output_folder = os.path.join('jobs', job.id)
+    os.makedirs(os.path.join(UPLOAD_FOLDER, output_folder), exist_ok=True)
+    # Profileren zoals bij /upload: per upload via het formulier of voor alles via FOTOCONVERTER_PROFILING
+    profiling = app.config['PROFILING'] or request.form.get('profiling')
+    report_folder = os.path.join(UPLOAD_FOLDER, output_folder) if profiling else None
+    try:
+        jobs.submit(uploads, convert_image, target_width, target_height, profile, output_folder, job=job,
+                    report_folder=report_folder)
+    except QueueFull:
+        os.rmdir(os.path.join(UPLOAD_FOLDER, output_folder))
+        return service_unavailable('Te veel uploads in de wachtrij, probeer het zo opnieuw')
+    except PoolUnavailable:
+        os.rmdir(os.path.join(UPLOAD_FOLDER, output_folder))
+        return service_unavailable('De conversieprocessen zijn niet beschikbaar, probeer het zo opnieuw')
+    status_url = url_for('job_status', job_id=job.id)
+    return jsonify(job=job.id, status_url=status_url), 202, {'Location': status_url}
+
+def service_unavailable(message):
+    return jsonify(error=message), 503, {'Retry-After': str(QUEUE_RETRY_AFTER_SECONDS)}
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error='Onbekende job'), 404
+    status = job.snapshot()
+    for file in status['files']:
+        if file['output']:
+            file['download_url'] = url_for('download_file', filename=file['output'])
+    return jsonify(status)
+
+@app.route('/images/<path:filename>')
+def resized_image(filename):
+    width = request.args.get('w', type=int)
+    height = request.args.get('h', type=int)
+    profile = request.args.get('format', DEFAULT_PROFILE)
+    max_size = app.config['RESIZE_MAX_SIZE']
+    if not width or not height or not 0 < width <= max_size or not 0 < height <= max_size:
+        return jsonify(error=f'Geef w en h tussen 1 en {max_size}'), 400
+    if profile not in available_profiles():
+        return jsonify(error='Onbekend formaat'), 400
+
+    source = safe_join(app.config['ORIGINALS_FOLDER'], filename)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+
+    # De sleutel hangt alleen af van de bron-stat en de parameters: een 304 kost geen decodering
+    try:
+        key = rendition_key(source, width, height, profile)
+    except FileNotFoundError:
+        abort(404)
+    headers = {'ETag': f'"{key}"', 'Cache-Control': f'public, max-age={app.config["RESIZE_MAX_AGE"]}'}
+    if request.if_none_match.contains(key):
+        return Response(status=304, headers=headers)
+
+    data = renditions.get(key)
+    if data is None:
+        try:
+            data = rendition_flights.do(key, render_and_cache, key, source, width, height, profile)
+        except FileNotFoundError:
+            abort(404)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+            # Geen (leesbare) afbeelding: een ander bestand in de map, of een afgebroken upload
+            return jsonify(error='Geen leesbare afbeelding'), 415
+    return Response(data, mimetype=profile_mimetype(profile), headers=headers)
 
-@app.route('/download/<filename>')
+def render_and_cache(key, source, width, height, profile):
+    # Een vorige vlucht kan net klaar zijn tussen de cachecontrole en het starten van deze;
+    # die staat dan in het geheugen (alleen daar kijken, zodat de treffertellers kloppen)
+    data = renditions.memory.get(key)
+    if data is None:
+        data = render_rendition(source, width, height, profile)
+        renditions.put(key, data)
+    return data
+
+@app.route('/metrics')
+def metrics():
+    return jsonify(renditions=renditions.metrics(), single_flight=rendition_flights.metrics())
+
+# Zo vaak een keep-alive op de voortgangsstroom als er niets klaar komt (proxies sluiten stille verbindingen)
+EVENTS_KEEPALIVE_SECONDS = 15
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    # Server-Sent Events: per klaar bestand een 'file'-event met doorvoer en ETA, tot slot 'done'.
+    # Een nieuwe verbinding krijgt eerst alles wat al klaar was, dus herladen of herverbinden kan altijd.
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error='Onbekende job'), 404
+
+    def events():
+        for file in jobs.iter_completed(job, timeout=EVENTS_KEEPALIVE_SECONDS):
+            if file is None:
+                yield ': keep-alive\n\n'
+                continue
+            data = dict(file, **job.progress())
+            if file['output']:
+                data['download_url'] = url_for('download_file', filename=file['output'])
+            yield f'event: file\ndata: {json.dumps(data)}\n\n'
+        data = dict(job.progress(), report=job.report, zip_url=url_for('download_job_zip', job_id=job.id))
+        yield f'event: done\ndata: {json.dumps(data)}\n\n'
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/download.zip')
+def download_job_zip(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error='Onbekende job'), 404
+
+    def outputs():
+        # Wacht per bestand op het werkproces: het archief loopt al terwijl de rest nog converteert
+        for file in jobs.iter_completed(job):
+            if file and file['output']:
+                yield os.path.join(UPLOAD_FOLDER, file['output'])
+
+    return zip_response(unique_arcnames(outputs()), f'fotos-{job.id[:8]}.zip')
+
+@app.route('/download.zip')
+def download_zip():
+    # Alle uitvoer van een gewone upload in één keer; alleen bestanden binnen UPLOAD_FOLDER
+    paths = [safe_join(UPLOAD_FOLDER, filename) for filename in request.args.getlist('files')]
+    paths = [path for path in paths if path and os.path.isfile(path)]
+    if not paths:
+        abort(404)
+    return zip_response(unique_arcnames(paths), 'fotos.zip')
+
+def zip_response(files, download_name):
+    return Response(stream_zip(files), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{download_name}"'})
+
+@app.route('/download/<path:filename>')
 def download_file(filename):
     return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=True)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'jpg', 'jpeg', 'png'}
 
-def convert_image(file_path, target_width, target_height):
-    with Image.open(file_path) as img:
+def unique_stems(filenames):
+    # a.jpg en a.png (of twee keer a.jpg) zouden binnen één job allebei a_converted opleveren
+    seen = set()
+    for filename in filenames:
+        base, extension = os.path.splitext(filename)
+        stem, counter = base, 1
+        while stem in seen:
+            counter += 1
+            stem = f'{base}-{counter}'
+        seen.add(stem)
+        yield stem + extension
+
+def convert_image(source, filename, target_width, target_height, profile=DEFAULT_PROFILE, output_folder=''):
+    # source is een pad of een open bestand (de uploadstroom); alleen de uitvoer komt op schijf.
+    # output_folder is relatief aan UPLOAD_FOLDER en zit ook in de teruggegeven naam.
+    with Image.open(source) as img:
         img = img.resize((target_width, target_height), Image.LANCZOS)
-        converted_filename = file_path.replace('.jpg', '_converted.png').replace('.jpeg', '_converted.png').replace('.png', '_converted.png')
-        img.save(converted_filename)
-    return os.path.basename(converted_filename)  # Geef de naam van het geconverteerde bestand terug
+        converted_filename = os.path.splitext(filename)[0] + '_converted' + profile_extension(profile)
+        converted_filename = '/'.join(filter(None, [output_folder.replace(os.sep, '/'), converted_filename]))
+        encode(img, os.path.join(UPLOAD_FOLDER, converted_filename), profile)
+    return converted_filename  # Geef de naam van het geconverteerde bestand terug
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,89 @@
+import cProfile
+import json
+import pstats
+import tracemalloc
+
+# Zoveel beelden met de hoogste geheugenpiek komen in het overzicht
+LARGEST_PEAKS = 20
+
+
+class StatsSnapshot:
+    # pstats.Stats accepteert alles met create_stats() en een stats-attribuut
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def profiled(function, *args):
+    # Draait in een werkproces: de aanroep onder cProfile en tracemalloc. De statistieken gaan
+    # als gewone dict terug naar het hoofdproces, dat ze over alle processen optelt.
+    # Let op: tracemalloc ziet alleen Python-geheugen (bytes, buffers), niet de pixelbuffers van Pillow.
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        result = profiler.runcall(function, *args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    profiler.create_stats()
+    return result, profiler.stats, peak
+
+
+class ProfileCollector:
+    def __init__(self):
+        self.stats = pstats.Stats()
+        self.peaks = []
+
+    def add(self, stats, file=None, peak=None):
+        self.stats.add(StatsSnapshot(stats))
+        if file is not None and peak is not None:
+            self.peaks.append((peak, file))
+
+    def profile(self, file, function, *args):
+        # Zelfde meting in het eigen proces, voor de Flask-apps
+        result, stats, peak = profiled(function, *args)
+        self.add(stats, file, peak)
+        return result
+
+    def memory_summary(self):
+        peaks = sorted(self.peaks, reverse=True)
+        return {
+            "images": len(peaks),
+            "max_peak_bytes": peaks[0][0] if peaks else 0,
+            "largest_peaks": [{"file": file, "peak_bytes": peak} for peak, file in peaks[:LARGEST_PEAKS]],
+        }
+
+    def write(self, base_path):
+        # <base>.pstats voor pstats/snakeviz, <base>.folded voor flamegraph.pl/speedscope, <base>.memory.json
+        paths = {"pstats": base_path + ".pstats", "folded": base_path + ".folded",
+                 "memory": base_path + ".memory.json"}
+        self.stats.dump_stats(paths["pstats"])
+
+        with open(paths["folded"], "w", encoding="utf-8") as f:
+            for line in self.folded_stacks():
+                f.write(line + "\n")
+
+        with open(paths["memory"], "w", encoding="utf-8") as f:
+            json.dump(self.memory_summary(), f, indent=2)
+        return paths
+
+    def folded_stacks(self):
+        # cProfile bewaart alleen aanroeper -> aangeroepene; dat geeft stapels van twee niveaus,
+        # met de eigen tijd van de functie per aanroeper (in microseconden)
+        for function, (_, _, total_time, _, callers) in self.stats.stats.items():
+            if not callers:
+                yield f"{function_label(function)} {int(total_time * 1_000_000)}"
+                continue
+            for caller, caller_stats in callers.items():
+                own_time = caller_stats[2]
+                if own_time > 0:
+                    yield f"{function_label(caller)};{function_label(function)} {int(own_time * 1_000_000)}"
+
+
+def function_label(function):
+    file, line, name = function
+    label = f"{name} ({file.replace(chr(92), '/').rsplit('/', 1)[-1]}:{line})"
+    # Puntkomma's en spaties hebben een betekenis in het folded-formaat
+    return label.replace(";", ",").replace(" ", "_")
@@ -0,0 +1,159 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from encoders import encode
+from engine import apply_jpeg_draft, crop_resize
+
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 1024 * 1024 * 1024
+
+
+def rendition_key(source, width, height, profile, resize_quality="balanced"):
+    # Bron (pad, mtime, grootte) plus parameters: verandert de bron, dan verandert de sleutel vanzelf.
+    # Dezelfde sleutel levert altijd dezelfde bytes op, dus hij dient ook als sterke ETag.
+    stat = os.stat(source)
+    text = (f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}|"
+            f"{width}x{height}|{profile}|{resize_quality}")
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def render_rendition(source, width, height, profile, resize_quality="balanced"):
+    with Image.open(source) as img:
+        apply_jpeg_draft(img, [(width, height)])
+        img_resized = crop_resize(img, width, height, resize_quality)
+    buffer = io.BytesIO()
+    encode(img_resized, buffer, profile)
+    return buffer.getvalue()
+
+
+class MemoryLRU:
+    # Begrensd op het totaal aantal bytes, niet op het aantal items: een 2000px-PNG telt zwaarder dan een icoon
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            data = self.items.get(key)
+            if data is not None:
+                self.items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.items.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class DiskCache:
+    # Eén bestand per sleutel; de volgorde van gebruik staat in het geheugen en wordt bij het starten
+    # uit de mtimes opgebouwd. Boven max_bytes gaan de langst niet gebruikte bestanden weg.
+    def __init__(self, directory, max_bytes=DEFAULT_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        entries = []
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        self.files = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.size = sum(self.files.values())
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.files:
+                return None
+            self.files.move_to_end(key)
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+            # mtime bijwerken, zodat de volgorde van gebruik een herstart overleeft
+            os.utime(self.path(key))
+        except OSError:
+            with self.lock:
+                self.size -= self.files.pop(key, 0)
+            return None
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        try:
+            fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temporary, self.path(key))
+        except OSError:
+            return
+
+        with self.lock:
+            self.size -= self.files.pop(key, 0)
+            self.files[key] = len(data)
+            self.size += len(data)
+            evicted = []
+            while self.size > self.max_bytes:
+                name, size = self.files.popitem(last=False)
+                self.size -= size
+                evicted.append(name)
+        for name in evicted:
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+
+
+class RenditionCache:
+    # Eerst het geheugen, dan de schijf; een treffer op schijf wordt weer in het geheugen gezet
+    def __init__(self, directory, memory_bytes=DEFAULT_MEMORY_BYTES, disk_bytes=DEFAULT_DISK_BYTES):
+        self.memory = MemoryLRU(memory_bytes)
+        self.disk = DiskCache(directory, disk_bytes)
+        self.lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0, "miss": 0}
+
+    def get(self, key):
+        tier = "memory"
+        data = self.memory.get(key)
+        if data is None:
+            data = self.disk.get(key)
+            tier = "disk" if data is not None else "miss"
+            if data is not None:
+                self.memory.put(key, data)
+        with self.lock:
+            self.hits[tier] += 1
+        return data
+
+    def put(self, key, data):
+        self.memory.put(key, data)
+        self.disk.put(key, data)
+
+    def metrics(self):
+        with self.lock:
+            hits = dict(self.hits)
+        return {
+            "hits": hits,
+            "memory": {"items": len(self.memory.items), "bytes": self.memory.size},
+            "disk": {"files": len(self.disk.files), "bytes": self.disk.size},
+        }
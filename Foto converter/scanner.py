@@ -0,0 +1,74 @@
+import os
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Begin van het bestand -> formaat; voor leveringen met ontbrekende of verkeerde extensies
+SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+SNIFF_BYTES = 16
+
+
+def is_image_name(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def sniff_image(path):
+    # Geeft het formaat terug op basis van de inhoud, of None; leest alleen de eerste bytes
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        return None
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, image_format in SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def is_image_file(path, sniff=False):
+    return sniff_image(path) is not None if sniff else is_image_name(path)
+
+
+def iter_image_files(paths, exclude=None, sniff=False):
+    # Loopt lazy door bestanden en mappen (recursief via os.scandir), zonder alles in het geheugen te laden.
+    # Met sniff telt de inhoud van het bestand in plaats van de extensie.
+    exclude = os.path.abspath(exclude) if exclude else None
+    for path in paths:
+        if os.path.isdir(path):
+            yield from walk(path, exclude, sniff)
+        elif is_image_file(path, sniff):
+            yield path
+
+
+def walk(directory, exclude=None, sniff=False):
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        if exclude and os.path.abspath(current) == exclude:
+            continue
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+
+        subdirectories = []
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.is_file() and (sniff_image(entry.path) if sniff else is_image_name(entry.name)):
+                        yield entry.path
+                except OSError:
+                    continue
+        # Omgekeerd op de stapel, zodat submappen in leesvolgorde worden bezocht
+        stack.extend(reversed(subdirectories))
@@ -0,0 +1,57 @@
+import threading
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Gelijke aanvragen die tegelijk binnenkomen delen één berekening: de eerste rekent,
+    # de rest wacht op hetzelfde resultaat (of dezelfde fout)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.computed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def do(self, key, function, *args):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.computed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function(*args)
+        except Exception as e:
+            flight.error = e
+            with self.lock:
+                self.errors += 1
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "computed": self.computed,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "in_flight": len(self.flights),
+            }
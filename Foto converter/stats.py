@@ -0,0 +1,138 @@
+import heapq
+import json
+import os
+import time
+
+# Bijsnijden gebeurt samen met schalen (resize met box) en valt daarom onder "resize"
+STAGES = ("read", "decode", "resize", "encode", "write")
+SLOWEST_FILES = 20
+# Zo vaak per seconde wordt een interface hooguit bijgewerkt, los van het aantal bestanden
+PROGRESS_REFRESH_RATE = 10
+
+
+class RunStats:
+    def __init__(self, total_files=None):
+        self.total_files = total_files
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.done = 0
+        self.converted = 0
+        # Overgeslagen (al up-to-date) tellen mee in done, maar niet in het tempo
+        self.skipped = 0
+        self.work_started = None
+        self.last_recorded = self.started
+        self.errors = []
+        # Kleine heap met de traagste bestanden, zodat het rapport ook bij miljoenen bestanden klein blijft
+        self.slowest = []
+
+    def record(self, file, timings=None, error=None, skipped=False):
+        self.done += 1
+        if skipped:
+            self.skipped += 1
+        elif self.work_started is None:
+            # Het echte werk begon na het laatste bestand dat hiervoor klaar was (meestal een reeks overgeslagen)
+            self.work_started = self.last_recorded
+        self.last_recorded = time.perf_counter()
+        if error:
+            self.errors.append({"file": file, "error": error})
+        if not timings:
+            return
+
+        self.converted += 1
+        seconds = 0.0
+        for stage in STAGES:
+            self.stages[stage] += timings.get(stage, 0.0)
+            seconds += timings.get(stage, 0.0)
+        self.bytes_in += timings.get("bytes_in", 0)
+        self.bytes_out += timings.get("bytes_out", 0)
+
+        entry = (seconds, file)
+        if len(self.slowest) < SLOWEST_FILES:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def images_per_second(self):
+        # Alleen verwerkte bestanden (geconverteerd of mislukt), vanaf het moment dat dat werk begon: een hervatte
+        # run die eerst duizenden up-to-date bestanden overslaat, zou anders een veel te hoog tempo tonen
+        processed = self.done - self.skipped
+        if not processed:
+            return 0.0
+        elapsed = time.perf_counter() - self.work_started
+        return processed / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        # Resterende seconden bij het huidige tempo; onbekend bij een stroom zonder totaal.
+        # Nog niet bekeken bestanden tellen als werk, ook als ze straks up-to-date blijken.
+        rate = self.images_per_second()
+        if self.total_files is None or not rate:
+            return None
+        return max(self.total_files - self.done, 0) / rate
+
+    def report(self, **extra):
+        elapsed = self.elapsed()
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "seconds": round(elapsed, 3),
+            "files": self.done,
+            "converted": self.converted,
+            "images_per_second": round(self.images_per_second(), 2),
+            "mb_in_per_second": round(self.bytes_in / (1024 * 1024) / elapsed, 2) if elapsed else 0.0,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            # Opgeteld over alle werkprocessen, dus groter dan de wandkloktijd bij meerdere processen
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+            "slowest_files": [{"file": file, "seconds": round(seconds, 3)}
+                              for seconds, file in sorted(self.slowest, reverse=True)],
+            "errors": self.errors,
+            **extra,
+        }
+
+    def report_base(self, directory):
+        # Rapport en eventuele profielbestanden delen deze naam, met elk een eigen extensie
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        return os.path.join(directory, f".fotoconverter-report-{stamp}")
+
+    def write(self, directory, **extra):
+        path = self.report_base(directory) + ".json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(**extra), f, indent=2)
+        return path
+
+
+class ProgressThrottle:
+    # Telt de resultaten van alle werkprocessen mee, maar meldt pas weer iets als het interval voorbij is.
+    # Het laatste bestand gaat altijd door, zodat de eindstand klopt.
+    def __init__(self, rate=PROGRESS_REFRESH_RATE):
+        self.interval = 1.0 / rate
+        self.last_update = None
+        self.errors = 0
+        self.last_error = None
+
+    def update(self, done, total_files=None, error=None):
+        if error:
+            self.errors += 1
+            self.last_error = error
+        now = time.monotonic()
+        if self.last_update is not None and now - self.last_update < self.interval and done != total_files:
+            return False
+        self.last_update = now
+        return True
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "onbekend"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}u {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
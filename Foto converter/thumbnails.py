@@ -0,0 +1,65 @@
+import hashlib
+import io
+import os
+import sys
+import tempfile
+
+from PIL import Image, ImageOps
+
+THUMBNAIL_SIZE = 50
+
+
+def cache_directory():
+    # Per gebruiker, buiten de projectmap: de cache overleeft herstarts en wordt door alle mappen gedeeld
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "fotoconverter", "thumbnails")
+
+
+def thumbnail_key(file, size=THUMBNAIL_SIZE):
+    # Pad plus mtime en grootte: een gewijzigde foto krijgt vanzelf een nieuwe thumbnail
+    stat = os.stat(file)
+    text = f"{os.path.abspath(file)}|{stat.st_mtime_ns}|{stat.st_size}|{size}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def make_thumbnail(file, size=THUMBNAIL_SIZE):
+    with Image.open(file) as img:
+        # JPEG: laat de decoder direct op 1/2..1/8 van de resolutie decoderen in plaats van volledig
+        img.draft("RGB", (size * 2, size * 2))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size), Image.BILINEAR, reducing_gap=2.0)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        buffer = io.BytesIO()
+        img.save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def load_thumbnail(file, size=THUMBNAIL_SIZE, directory=None):
+    # Geeft PNG-bytes terug; draait in een achtergrondthread, dus zonder Qt-objecten
+    directory = directory or cache_directory()
+    path = os.path.join(directory, thumbnail_key(file, size) + ".png")
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+
+    data = make_thumbnail(file, size)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Eerst naar een tijdelijk bestand, zodat een andere thread nooit een half bestand leest
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+    except OSError:
+        # Geen schrijfbare cache: de thumbnail is er toch, alleen niet bewaard
+        pass
+    return data
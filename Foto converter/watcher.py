@@ -0,0 +1,201 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import ConversionEngine
+from scanner import is_image_name, iter_image_files, walk
+
+# inotify-vlaggen uit <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyBackend:
+    # Linux: de kernel meldt nieuwe en gesloten bestanden, zonder de map steeds te doorlopen
+    def __init__(self, directories):
+        self.directories = directories
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 mislukt")
+
+        self.watches = {}
+        for directory in directories:
+            self.add_tree(directory)
+
+    def add_tree(self, directory):
+        self.add_watch(directory)
+        for root, subdirectories, _ in os.walk(directory):
+            for subdirectory in subdirectories:
+                self.add_watch(os.path.join(root, subdirectory))
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def poll(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        data = b""
+        while True:
+            try:
+                data += os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Gebeurtenissen verloren: alles opnieuw bekijken, het manifest slaat het oude over
+                changed.extend(iter_image_files(self.directories))
+                continue
+            if wd not in self.watches or not name:
+                continue
+
+            path = os.path.join(self.watches[wd], os.fsdecode(name))
+            if mask & IN_ISDIR:
+                # Nieuwe of verplaatste map: ook bewaken en de inhoud meenemen
+                self.add_tree(path)
+                changed.extend(walk(path))
+            elif is_image_name(path):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingBackend:
+    # Terugval voor andere systemen en netwerkschijven waar inotify niets ziet
+    def __init__(self, directories):
+        self.directories = directories
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for path in iter_image_files(self.directories):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(timeout)
+        snapshot = self.scan()
+        changed = [path for path, signature in snapshot.items() if self.snapshot.get(path) != signature]
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_backend(directories, polling=False):
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyBackend(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingBackend(directories)
+
+
+class WatchDaemon:
+    def __init__(self, directories, settings, workers=None, settle_seconds=2.0, poll_interval=1.0,
+                 batch_size=None, batch_window=1.0, polling=False):
+        self.directories = directories
+        self.settings = settings
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.polling = polling
+
+        # Pad -> ((grootte, mtime), tijdstip van de laatste wijziging)
+        self.pending = {}
+        self.ready = []
+        self.ready_since = None
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def track(self, path):
+        if self.settings.target_directory and os.path.abspath(path).startswith(
+                os.path.abspath(self.settings.target_directory) + os.sep):
+            return
+        if path not in self.ready:
+            self.pending[path] = (None, time.monotonic())
+
+    def settle(self):
+        # Een bestand is klaar als grootte en mtime een tijd niet veranderd zijn (half geschreven bestanden wachten)
+        now = time.monotonic()
+        for path, (signature, changed_at) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self.pending[path] = (current, now)
+            elif now - changed_at >= self.settle_seconds and stat.st_size > 0:
+                del self.pending[path]
+                self.ready.append(path)
+                self.ready_since = self.ready_since or now
+
+    def take_batch(self, batch_size):
+        # Pas starten als de batch vol is of lang genoeg gewacht heeft, zodat de pool gevuld blijft
+        if not self.ready:
+            return []
+        waited = time.monotonic() - self.ready_since
+        if len(self.ready) < batch_size and waited < self.batch_window and self.pending:
+            return []
+        batch, self.ready = self.ready[:batch_size], self.ready[batch_size:]
+        self.ready_since = time.monotonic() if self.ready else None
+        return batch
+
+    def run(self, on_result=None):
+        backend = create_backend(self.directories, self.polling)
+        engine = ConversionEngine(self.settings, workers=self.workers, report=False)
+        batch_size = self.batch_size or engine.max_pending
+
+        try:
+            with ProcessPoolExecutor(max_workers=engine.workers) as pool:
+                engine.pool = pool
+                # Na een herstart: alles bekijken; het manifest in de doelmap slaat wat al klaar was over
+                for path in iter_image_files(self.directories, exclude=self.settings.target_directory):
+                    self.track(path)
+
+                while not self.stopped:
+                    timeout = self.poll_interval if not self.pending else min(self.poll_interval, 0.5)
+                    for path in backend.poll(timeout):
+                        self.track(path)
+                    self.settle()
+
+                    batch = self.take_batch(batch_size)
+                    if batch:
+                        engine.run(batch, on_result=on_result)
+        finally:
+            backend.close()
@@ -0,0 +1,33 @@
+import os
+from tempfile import SpooledTemporaryFile
+
+from flask import Request, current_app
+
+# Uploads tot deze grootte blijven in het geheugen; grotere lopen over naar een tijdelijk bestand
+DEFAULT_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+class SpooledRequest(Request):
+    # Werkzeug schrijft elke upload boven 500 KB naar een tijdelijk bestand; hier bepaalt
+    # UPLOAD_SPOOL_SIZE die grens, zodat een gewone productfoto de schijf niet raakt
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_size = current_app.config.get("UPLOAD_SPOOL_SIZE", DEFAULT_SPOOL_SIZE)
+        return SpooledTemporaryFile(max_size=max_size, mode="rb+")
+
+
+def configure_uploads(app):
+    app.request_class = SpooledRequest
+    app.config.setdefault("UPLOAD_SPOOL_SIZE",
+                          int(os.environ.get("FOTOCONVERTER_SPOOL_SIZE", DEFAULT_SPOOL_SIZE)))
+    # Originelen alleen bewaren als dat gevraagd is; standaard wordt alleen de uitvoer geschreven
+    app.config.setdefault("KEEP_ORIGINALS", os.environ.get("FOTOCONVERTER_KEEP_ORIGINALS") == "1")
+    # Daar komen bewaarde originelen terecht, en daaruit maakt /images zijn formaten op aanvraag.
+    # Apart van de uitvoer en rapporten, en aan te wijzen als de originelen al ergens anders staan.
+    app.config.setdefault("ORIGINALS_FOLDER", os.environ.get("FOTOCONVERTER_ORIGINALS", "originals"))
+    os.makedirs(app.config["ORIGINALS_FOLDER"], exist_ok=True)
+
+
+def keep_original(file, folder, filename):
+    # Na de conversie: de stroom terugspoelen en het origineel alsnog wegschrijven
+    file.stream.seek(0)
+    file.save(os.path.join(folder, filename))
@@ -0,0 +1,69 @@
+import os
+import zipfile
+
+# Al gecomprimeerde formaten: nog eens deflaten kost CPU en levert vrijwel niets op
+STORED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".avif")
+CHUNK_SIZE = 1024 * 1024
+
+
+class ZipBuffer:
+    # Vangt wat zipfile schrijft op tot de generator het doorgeeft. Zonder seek() schrijft zipfile
+    # in streaming-modus (grootte en CRC achter elk bestand), zodat niets terug hoeft te worden geschreven.
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files):
+    # files: (naam in het archief, pad), mag een generator zijn die wacht tot het volgende bestand klaar is.
+    # Levert het archief in stukken van hooguit CHUNK_SIZE (plus headers), nooit het geheel.
+    buffer = ZipBuffer()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for arcname, path in files:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            stored = path.lower().endswith(STORED_EXTENSIONS)
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            with open(path, "rb") as source, archive.open(info, "w") as target:
+                while True:
+                    block = source.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    target.write(block)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    # Centrale directory
+    yield buffer.drain()
+
+
+def unique_arcnames(paths):
+    # Twee bronnen met dezelfde naam zouden elkaar in het archief overschrijven
+    seen = set()
+    for path in paths:
+        arcname = os.path.basename(path)
+        base, extension = os.path.splitext(arcname)
+        counter = 1
+        while arcname in seen:
+            counter += 1
+            arcname = f"{base}-{counter}{extension}"
+        seen.add(arcname)
+        yield arcname, path